@@ -0,0 +1,304 @@
+"""Benchmark robota commands end to end against fake Jira and GitHub servers.
+
+Usage:
+    python benchmarks/commands.py [--size small|medium|large] [--runs 5]
+        [--save-baseline FILE | --baseline FILE [--threshold 0.25]] [scenario ...]
+
+The real commands run in fresh interpreters, talking to the servers from
+`fakes.py` and to local bare git remotes (git@github.com: URLs are rewritten to
+them), so no network access or credentials are needed. For each scenario the
+median wall time, the number of Jira and GitHub requests and the peak memory of
+the command are reported.
+
+With `--baseline`, the results are compared to a file written earlier with
+`--save-baseline` for the same size, and the exit status is 1 if a command got
+slower or bigger by more than the threshold, or made more requests.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fakes import FakeGitHub, FakeJira
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SIZES = {
+    "small": dict(issues=500, my_issues=50, boards=2, repos=5, prs=20, files=100),
+    "medium": dict(issues=5000, my_issues=300, boards=4, repos=20, prs=150, files=1000),
+    "large": dict(
+        issues=30000, my_issues=1000, boards=8, repos=60, prs=500, files=5000
+    ),
+}
+STORY = "PA-1"
+WORKSPACE_REPOS = 3
+
+
+class Bench:
+    """The fake servers, git remotes and directories shared by all scenarios."""
+
+    def __init__(self, workdir, size):
+        self.workdir = workdir
+        self.size = size
+        self.jira = FakeJira(
+            issues=size["issues"], my_issues=size["my_issues"], boards=size["boards"]
+        )
+        self.github = FakeGitHub(repos=size["repos"], prs=size["prs"])
+        self.remotes = os.path.join(workdir, "remotes")
+        self.checkout_dir = os.path.join(workdir, "checkout")
+        self.cache_dir = os.path.join(workdir, "cache")
+        self.code_dir = os.path.join(workdir, "code")
+        for path in [self.checkout_dir, self.cache_dir, self.code_dir]:
+            os.makedirs(path)
+        self.make_remotes()
+
+    @property
+    def workspace(self):
+        return os.path.join(self.checkout_dir, STORY.lower())
+
+    def env(self):
+        # Nothing may point at the developer's own store, mirrors or daemon
+        env = {
+            name: value
+            for name, value in os.environ.items()
+            if name not in ("STORE_FILE", "MIRROR_DIR", "DAEMON_SOCKET")
+        }
+        env.update(
+            {
+                "ROBOTA_CODE_DIR": self.code_dir,
+                "JIRA_HOST": self.jira.url,
+                "JIRA_EMAIL": "bench@example.com",
+                "JIRA_API_TOKEN": "bench",
+                "GITHUB_API_URL": self.github.url,
+                "GITHUB_API_KEY": "bench",
+                "GITHUB_USERNAME": "bench",
+                "GITHUB_ORG": self.github.org,
+                "GITHUB_REPOS": ",".join(self.github.repos),
+                "STATE_FILE": os.path.join(self.workdir, "state.json"),
+                "CHECKOUT_DIR": self.checkout_dir,
+                "CACHE_DIR": self.cache_dir,
+                "USER_NICKNAME": "bench",
+                "IDE_COMMAND": "true",
+                "TERMINAL_COMMAND": "true",
+                "GIT_CONFIG_COUNT": "1",
+                "GIT_CONFIG_KEY_0": f"url.file://{self.remotes}/.insteadOf",
+                "GIT_CONFIG_VALUE_0": "git@github.com:",
+                "GIT_AUTHOR_NAME": "Bench",
+                "GIT_AUTHOR_EMAIL": "bench@example.com",
+                "GIT_COMMITTER_NAME": "Bench",
+                "GIT_COMMITTER_EMAIL": "bench@example.com",
+            }
+        )
+        return env
+
+    def make_remotes(self):
+        """One seed repository with `files` files, cloned bare for every repo."""
+        seed = os.path.join(self.workdir, "seed")
+        os.makedirs(seed)
+        for n in range(self.size["files"]):
+            directory = os.path.join(seed, f"pkg{n % 20}")
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, f"module{n}.py"), "w") as f:
+                f.write(f"VALUE = {n}\n" * 20)
+        env = self.env()
+        git = lambda *args, cwd=seed: subprocess.run(
+            ["git", *args], cwd=cwd, env=env, check=True, capture_output=True
+        )
+        git("init", "--quiet", "--initial-branch=main")
+        git("add", ".")
+        git("commit", "--quiet", "-m", "Seed")
+        for repo in self.github.repos:
+            git(
+                "clone",
+                "--quiet",
+                "--bare",
+                seed,
+                os.path.join(self.remotes, self.github.org, f"{repo}.git"),
+                cwd=self.workdir,
+            )
+
+    def run(self, args, cwd=None):
+        """Run a robota command, returning its wall time in ms and peak RSS in MB."""
+        self.jira.reset_counts()
+        self.github.reset_counts()
+        env = self.env()
+        env["ROBOTA_CODE_DIR"] = cwd or self.code_dir
+        with tempfile.TemporaryFile() as output:
+            start = time.perf_counter()
+            process = subprocess.Popen(
+                [sys.executable, "-m", "robota", *args],
+                cwd=REPO_ROOT,
+                env=env,
+                stdin=subprocess.DEVNULL,
+                stdout=output,
+                stderr=subprocess.STDOUT,
+            )
+            _, status, usage = os.wait4(process.pid, 0)
+            elapsed = (time.perf_counter() - start) * 1000
+            process.returncode = os.waitstatus_to_exitcode(status)
+            if process.returncode != 0:
+                output.seek(0)
+                raise RuntimeError(
+                    f"robota {' '.join(args)} exited with {process.returncode}:\n"
+                    + output.read().decode(errors="replace")
+                )
+        # ru_maxrss is in kilobytes on Linux
+        return elapsed, usage.ru_maxrss / 1024
+
+    def ensure_workspace(self):
+        if not os.path.exists(self.workspace):
+            self.run(self.workon_args())
+
+    def workon_args(self):
+        return ["w", STORY, *self.github.repos[:WORKSPACE_REPOS]]
+
+    def change_repos(self, paths):
+        for path in paths:
+            with open(os.path.join(path, "bench_change.txt"), "w") as f:
+                f.write(f"{time.time()}\n")
+
+    def workspace_repo_paths(self):
+        return [
+            os.path.join(self.workspace, repo)
+            for repo in self.github.repos[:WORKSPACE_REPOS]
+        ]
+
+
+def scenarios(bench):
+    """(name, setup, args, cwd) of each benchmark, in the order they run."""
+    store_files = [
+        os.path.join(bench.cache_dir, f"robota.sqlite3{suffix}")
+        for suffix in ["", "-wal", "-shm"]
+    ]
+
+    def clear_store():
+        for path in store_files:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear_workspace():
+        shutil.rmtree(bench.workspace, ignore_errors=True)
+
+    def change_one():
+        bench.ensure_workspace()
+        bench.change_repos(bench.workspace_repo_paths()[:1])
+
+    def change_all():
+        bench.ensure_workspace()
+        bench.change_repos(bench.workspace_repo_paths())
+
+    active_sprint = next(s["id"] for s in bench.jira.sprints if s["state"] == "active")
+    boards = [str(board["id"]) for board in bench.jira.boards]
+    first_repo = bench.workspace_repo_paths()[0]
+    return [
+        ("l-cold", clear_store, ["l"], None),
+        ("l", None, ["l"], None),
+        ("p", None, ["p"], None),
+        ("sprint-issues", None, ["sprint-issues", str(active_sprint)], None),
+        ("unestimated", None, ["unestimated", *boards], None),
+        ("sprint", None, ["sprint"], None),  # all boards, including Kanban
+        ("w", clear_workspace, bench.workon_args(), None),
+        ("pr", change_one, ["pr"], first_repo),
+        ("pr-all", change_all, ["pr-all"], bench.workspace),
+        ("status", bench.ensure_workspace, ["status"], None),
+        ("gc", bench.ensure_workspace, ["gc", "--dry-run"], None),
+    ]
+
+
+def measure(bench, setup, args, cwd, runs):
+    timings, peaks, jira_requests, github_requests = [], [], [], []
+    for run in range(runs + 1):
+        if setup:
+            setup()
+        elapsed, peak = bench.run(args, cwd)
+        if run == 0:
+            continue  # warm up mirrors, caches and the OS page cache
+        timings.append(elapsed)
+        peaks.append(peak)
+        jira_requests.append(sum(bench.jira.requests.values()))
+        github_requests.append(sum(bench.github.requests.values()))
+    return {
+        "wall_ms": round(statistics.median(timings), 1),
+        "jira_requests": max(jira_requests),
+        "github_requests": max(github_requests),
+        "peak_rss_mb": round(max(peaks), 1),
+    }
+
+
+def regressions(name, result, baseline, threshold):
+    found = []
+    for metric in ["wall_ms", "peak_rss_mb"]:
+        if result[metric] > baseline[metric] * (1 + threshold):
+            found.append(f"{name}: {metric} {baseline[metric]} -> {result[metric]}")
+    for metric in ["jira_requests", "github_requests"]:
+        if result[metric] > baseline[metric]:
+            found.append(f"{name}: {metric} {baseline[metric]} -> {result[metric]}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=SIZES, default="small")
+    for name in SIZES["small"]:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, dest=name)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--baseline", help="compare to this results file")
+    parser.add_argument("--save-baseline", help="write the results to this file")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("scenario", nargs="*")
+    options = parser.parse_args()
+
+    size = {
+        name: getattr(options, name) or default
+        for name, default in SIZES[options.size].items()
+    }
+    baseline = None
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        if baseline["size"] != size:
+            parser.error(f"{options.baseline} was recorded with {baseline['size']}")
+
+    results = {}
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        bench = Bench(workdir, size)
+        try:
+            print(
+                f"{'scenario':<14} {'median ms':>10} {'jira':>6} {'github':>7} {'peak MB':>8}"
+            )
+            for name, setup, args, cwd in scenarios(bench):
+                if options.scenario and name not in options.scenario:
+                    continue
+                result = measure(bench, setup, args, cwd, options.runs)
+                results[name] = result
+                print(
+                    f"{name:<14} {result['wall_ms']:>10.1f} {result['jira_requests']:>6}"
+                    f" {result['github_requests']:>7} {result['peak_rss_mb']:>8.1f}"
+                )
+                if baseline and name in baseline["results"]:
+                    failures.extend(
+                        regressions(
+                            name, result, baseline["results"][name], options.threshold
+                        )
+                    )
+        finally:
+            bench.jira.close()
+            bench.github.close()
+
+    if options.save_baseline:
+        with open(options.save_baseline, "w") as f:
+            json.dump({"size": size, "results": results}, f, indent=2)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
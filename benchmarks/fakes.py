@@ -0,0 +1,587 @@
+"""Stand-in Jira and GitHub servers for the command benchmarks.
+
+They implement just enough of the REST, Agile and GraphQL APIs for robota and
+its client libraries, over plain HTTP on localhost, and count the requests they
+serve so that the benchmarks can report them. Unsupported requests get an error
+response, so a command that starts using a new endpoint fails loudly here.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+ME = {"accountId": "bench-me", "displayName": "Bench Me", "name": "bench"}
+OTHERS = [
+    {"accountId": f"bench-{i}", "displayName": f"Teammate {i}", "name": f"tm{i}"}
+    for i in range(5)
+]
+STATUSES = ["To Do", "In Progress", "In Review", "Done"]
+TRANSITIONS = [
+    {"id": str(11 + 10 * i), "name": name, "to": {"name": name}}
+    for i, name in enumerate(STATUSES)
+]
+STORY_POINTS = "customfield_10016"
+SPRINTS = "customfield_10020"
+FIELDS = [
+    {"id": "summary", "name": "Summary", "clauseNames": ["summary"]},
+    {"id": "status", "name": "Status", "clauseNames": ["status"]},
+    {"id": "assignee", "name": "Assignee", "clauseNames": ["assignee"]},
+    {"id": "project", "name": "Project", "clauseNames": ["project"]},
+    {"id": "resolution", "name": "Resolution", "clauseNames": ["resolution"]},
+    {"id": "issuetype", "name": "Issue Type", "clauseNames": ["issuetype", "type"]},
+    {"id": "updated", "name": "Updated", "clauseNames": ["updated"]},
+    {
+        "id": STORY_POINTS,
+        "name": "Story Points",
+        "custom": True,
+        "clauseNames": ["cf[10016]", "Story Points"],
+        "schema": {"type": "number", "custom": "float"},
+    },
+    {
+        "id": SPRINTS,
+        "name": "Sprint",
+        "custom": True,
+        "clauseNames": ["cf[10020]", "sprint"],
+        "schema": {"type": "array", "items": "json", "custom": "gh-sprint"},
+    },
+]
+
+
+class FakeServer:
+    """A threaded HTTP server on a free localhost port, with request counting."""
+
+    # Whether GET responses carry an ETag and honor If-None-Match
+    etags = False
+
+    def __init__(self):
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                fake._handle(self, "GET")
+
+            def do_POST(self):
+                fake._handle(self, "POST")
+
+            def do_PUT(self):
+                fake._handle(self, "PUT")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests.clear()
+
+    def _handle(self, handler, method):
+        url = urlsplit(handler.path)
+        # Repeated parameters (like Jira's `fields`) are joined with commas
+        query = {k: ",".join(v) for k, v in parse_qs(url.query).items()}
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = json.loads(handler.rfile.read(length) or "null") if length else None
+        with self._lock:
+            self.requests[method] += 1
+        try:
+            status, payload = self.route(method, url.path, query, body)
+        except Exception as err:  # report bugs in the fake instead of hanging
+            status, payload = 500, {"errorMessages": [repr(err)]}
+        data = json.dumps(payload).encode() if payload is not None else b""
+        etag = None
+        if self.etags and method == "GET" and status == 200:
+            etag = f'"{hashlib.sha1(data).hexdigest()}"'
+            if handler.headers.get("If-None-Match") == etag:
+                status, data = 304, b""
+        handler.send_response(status)
+        if etag:
+            handler.send_header("ETag", etag)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def route(self, method, path, query, body):
+        raise NotImplementedError
+
+
+class FakeJira(FakeServer):
+    """Jira Cloud with `issues` issues, of which `my_issues` are assigned to me.
+
+    Each board has closed, one active and one future sprint; issues are spread
+    over the sprints of all boards, a quarter of them without story points.
+    One more board is a Kanban board, which has no sprints.
+    """
+
+    def __init__(self, issues=1000, my_issues=100, boards=3, projects=3):
+        super().__init__()
+        self.projects = [
+            {"id": str(10000 + i), "key": f"P{chr(65 + i)}", "name": f"Project {i}"}
+            for i in range(projects)
+        ]
+        self.boards = []
+        self.sprints = []
+        for board in range(boards):
+            board_id = board + 1
+            self.boards.append(
+                {"id": board_id, "name": f"Board {board_id}", "type": "scrum"}
+            )
+            for n, state in enumerate(["closed", "closed", "active", "future"]):
+                sprint_id = board_id * 100 + n
+                self.sprints.append(
+                    {
+                        "id": sprint_id,
+                        "name": f"Board {board_id} Sprint {n + 1}",
+                        "state": state,
+                        "boardId": board_id,
+                    }
+                )
+        kanban_id = boards + 1
+        self.boards.append({"id": kanban_id, "name": "Kanban", "type": "kanban"})
+        self.issues = {}
+        seeded = time.time() - 86400
+        for n in range(issues):
+            project = self.projects[n % projects]
+            sprint = self.sprints[n % len(self.sprints)]
+            mine = n < my_issues
+            status = STATUSES[n % 3] if mine or sprint["state"] != "closed" else "Done"
+            key = f"{project['key']}-{n + 1}"
+            self.issues[key] = {
+                "id": str(n + 1),
+                "key": key,
+                "updated_at": seeded,
+                "fields": {
+                    "summary": f"Benchmark story number {n + 1}",
+                    "status": {"name": status},
+                    "assignee": ME if mine else OTHERS[n % len(OTHERS)],
+                    "project": project,
+                    "resolution": {"name": "Done"} if status == "Done" else None,
+                    "issuetype": {"name": "Story"},
+                    STORY_POINTS: None if n % 4 == 3 else float(n % 5 + 1),
+                    SPRINTS: [sprint],
+                },
+            }
+
+    def issue_json(self, issue, fields=None):
+        values = issue["fields"]
+        if fields and "*all" not in fields:
+            values = {name: values[name] for name in fields if name in values}
+        return {
+            "id": issue["id"],
+            "key": issue["key"],
+            "self": f"{self.url}/rest/api/2/issue/{issue['id']}",
+            "fields": {
+                **values,
+                "updated": time.strftime(
+                    "%Y-%m-%dT%H:%M:%S.000+0000", time.gmtime(issue["updated_at"])
+                ),
+            },
+        }
+
+    def route(self, method, path, query, body):
+        api, agile = "/rest/api/2/", "/rest/agile/1.0/"
+        if path.startswith(api):
+            return self.route_api(method, path[len(api) :], query, body)
+        if path.startswith(agile):
+            return self.route_agile(path[len(agile) :], query)
+        return 404, {"errorMessages": [f"No route for {path}"]}
+
+    def route_api(self, method, path, query, body):
+        if path == "serverInfo":
+            return 200, {
+                "baseUrl": self.url,
+                "version": "1001.0.0",
+                "versionNumbers": [1001, 0, 0],
+                "deploymentType": "Cloud",
+            }
+        if path == "myself":
+            return 200, ME
+        if path == "field":
+            return 200, FIELDS
+        if path == "project":
+            return 200, self.projects
+        if path == "search":
+            return self.search(query.get("jql", ""), query)
+        match = re.fullmatch(r"issue/([^/]+)(/comment|/transitions)?", path)
+        if not match or match[1] not in self.issues:
+            return 404, {"errorMessages": ["Issue does not exist"]}
+        issue = self.issues[match[1]]
+        if match[2] is None:
+            return 200, self.issue_json(issue, query.get("fields", "*all").split(","))
+        if match[2] == "/comment" and method == "POST":
+            issue["updated_at"] = time.time()
+            return 201, {
+                "id": "1",
+                "body": body["body"],
+                "self": f"{self.url}/rest/api/2/issue/{issue['id']}/comment/1",
+            }
+        if match[2] == "/transitions" and method == "GET":
+            return 200, {"transitions": TRANSITIONS}
+        if match[2] == "/transitions" and method == "POST":
+            names = {t["id"]: t["name"] for t in TRANSITIONS}
+            if str(body["transition"]["id"]) not in names:
+                return 400, {"errorMessages": ["Transition is not valid"]}
+            name = names[str(body["transition"]["id"])]
+            issue["fields"]["status"] = {"name": name}
+            issue["fields"]["resolution"] = {"name": "Done"} if name == "Done" else None
+            issue["updated_at"] = time.time()
+            return 204, None
+        return 405, {"errorMessages": ["Method not allowed"]}
+
+    def route_agile(self, path, query):
+        if path == "board":
+            return 200, self.page(self.boards, query)
+        match = re.fullmatch(r"board/(\d+)/sprint", path)
+        if match:
+            board = next((b for b in self.boards if b["id"] == int(match[1])), None)
+            if board is None:
+                return 404, {"errorMessages": ["Board does not exist"]}
+            if board["type"] != "scrum":
+                return 400, {"errorMessages": ["The board does not support sprints"]}
+            states = query.get("state", "active,future,closed").split(",")
+            sprints = [
+                s
+                for s in self.sprints
+                if s["boardId"] == int(match[1]) and s["state"] in states
+            ]
+            return 200, self.page(sprints, query)
+        return 404, {"errorMessages": [f"No route for {path}"]}
+
+    def page(self, values, query):
+        start = int(query.get("startAt", 0))
+        size = int(query.get("maxResults", 50))
+        return {
+            "startAt": start,
+            "maxResults": size,
+            "total": len(values),
+            "isLast": start + size >= len(values),
+            "values": values[start : start + size],
+        }
+
+    def search(self, jql, query):
+        try:
+            matches = parse_jql(jql)
+        except ValueError as err:
+            return 400, {"errorMessages": [str(err)]}
+        found = [issue for issue in self.issues.values() if matches(issue)]
+        start = int(query.get("startAt", 0))
+        size = min(int(query.get("maxResults", 50)), 100)
+        fields = query.get("fields", "*all").split(",")
+        return 200, {
+            "startAt": start,
+            "maxResults": size,
+            "total": len(found),
+            "issues": [self.issue_json(i, fields) for i in found[start : start + size]],
+        }
+
+
+# The JQL clauses robota uses, each a regex and a predicate factory
+JQL_CLAUSES = [
+    (
+        r"assignee\s*=\s*currentUser\(\)",
+        lambda m: lambda i: (i["fields"]["assignee"] or {}).get("accountId")
+        == ME["accountId"],
+    ),
+    (
+        r"resolution\s*=\s*Unresolved",
+        lambda m: lambda i: i["fields"]["resolution"] is None,
+    ),
+    (
+        r"key\s+in\s*\(([^)]*)\)",
+        lambda m: (lambda keys: lambda i: i["key"] in keys)(_jql_list(m[1])),
+    ),
+    (
+        r"sprint\s*=\s*(\d+)",
+        lambda m: lambda i: any(s["id"] == int(m[1]) for s in i["fields"][SPRINTS]),
+    ),
+    (
+        r"sprint\s+in\s*\(([^)]*)\)",
+        lambda m: (
+            lambda ids: lambda i: any(s["id"] in ids for s in i["fields"][SPRINTS])
+        )({int(x) for x in _jql_list(m[1])}),
+    ),
+    (
+        r"(?:cf\[10016\]|\"Story Points\")\s+is\s+EMPTY",
+        lambda m: lambda i: i["fields"][STORY_POINTS] is None,
+    ),
+    (
+        r"project\s*=\s*\"?(\w+)\"?",
+        lambda m: lambda i: i["fields"]["project"]["key"] == m[1],
+    ),
+    (
+        r"status\s*=\s*\"([^\"]+)\"",
+        lambda m: lambda i: i["fields"]["status"]["name"] == m[1],
+    ),
+    (
+        r"updated\s*>=\s*\"-(\d+)m\"",
+        lambda m: lambda i: i["updated_at"] >= time.time() - int(m[1]) * 60,
+    ),
+]
+
+
+def _jql_list(text):
+    return {item.strip().strip('"') for item in text.split(",") if item.strip()}
+
+
+def parse_jql(jql):
+    """Compile the subset of JQL that robota sends into a predicate on issues.
+
+    Clauses may be combined with AND, OR and parentheses; ORDER BY is ignored.
+    Raises ValueError for anything else, which the fake answers with a 400.
+    """
+    jql = re.split(r"\s+ORDER\s+BY\s+", jql, flags=re.IGNORECASE)[0].strip()
+    tokens = []
+    pos = 0
+    while pos < len(jql):
+        if jql[pos].isspace():
+            pos += 1
+            continue
+        for pattern, factory in JQL_CLAUSES:
+            match = re.compile(pattern, re.IGNORECASE).match(jql, pos)
+            if match:
+                tokens.append(factory(match))
+                pos = match.end()
+                break
+        else:
+            match = re.compile(r"\(|\)|AND\b|OR\b", re.IGNORECASE).match(jql, pos)
+            if not match:
+                raise ValueError(f"Unsupported JQL at: {jql[pos:]}")
+            tokens.append(match[0].upper())
+            pos = match.end()
+
+    def expression(i):
+        left, i = term(i)
+        while i < len(tokens) and tokens[i] == "OR":
+            right, i = term(i + 1)
+            left = (lambda a, b: lambda issue: a(issue) or b(issue))(left, right)
+        return left, i
+
+    def term(i):
+        left, i = factor(i)
+        while i < len(tokens) and tokens[i] == "AND":
+            right, i = factor(i + 1)
+            left = (lambda a, b: lambda issue: a(issue) and b(issue))(left, right)
+        return left, i
+
+    def factor(i):
+        if i >= len(tokens):
+            raise ValueError("Unexpected end of JQL")
+        if tokens[i] == "(":
+            inner, i = expression(i + 1)
+            if i >= len(tokens) or tokens[i] != ")":
+                raise ValueError("Unbalanced parentheses in JQL")
+            return inner, i + 1
+        if callable(tokens[i]):
+            return tokens[i], i + 1
+        raise ValueError(f"Unexpected {tokens[i]} in JQL")
+
+    if not tokens:
+        return lambda issue: True
+    predicate, end = expression(0)
+    if end != len(tokens):
+        raise ValueError("Trailing tokens in JQL")
+    return predicate
+
+
+class FakeGitHub(FakeServer):
+    """GitHub with `repos` repositories in `org` and `prs` open PRs of mine."""
+
+    etags = True
+
+    def __init__(self, org="bench-org", repos=10, prs=50):
+        super().__init__()
+        self.org = org
+        self.repos = [f"repo-{i}" for i in range(repos)]
+        self.pulls = [
+            self.new_pull(
+                n + 1,
+                self.repos[n % repos],
+                f"bench-pa-{n + 1}",
+                f"Benchmark PR {n + 1}",
+            )
+            for n in range(prs)
+        ]
+        for n, pull in enumerate(self.pulls):
+            pull["draft"] = n % 3 == 0
+
+    def new_pull(self, number, repository, head, title, draft=False):
+        return {
+            "number": number,
+            "title": title,
+            "repository": repository,
+            "head": head,
+            "sha": f"{number:040x}",
+            "draft": draft,
+            "state": "open",
+            "merged": False,
+            "review": "REVIEW_REQUIRED",
+            "checks": "SUCCESS",
+        }
+
+    def repo_json(self, name):
+        url = f"{self.url}/repos/{self.org}/{name}"
+        return {
+            "id": self.repos.index(name) + 1,
+            "name": name,
+            "full_name": f"{self.org}/{name}",
+            "owner": {"login": self.org},
+            "default_branch": "main",
+            "url": url,
+            "html_url": f"https://github.com/{self.org}/{name}",
+        }
+
+    def pull_json(self, pull):
+        url = f"{self.url}/repos/{self.org}/{pull['repository']}/pulls/{pull['number']}"
+        return {
+            "number": pull["number"],
+            "title": pull["title"],
+            "state": pull["state"],
+            "merged": pull["merged"],
+            "draft": pull["draft"],
+            "url": url,
+            "html_url": f"https://github.com/{self.org}/{pull['repository']}/pull/{pull['number']}",
+            "head": {"ref": pull["head"], "sha": pull["sha"]},
+            "base": {"ref": "main"},
+        }
+
+    def route(self, method, path, query, body):
+        if path == "/graphql" and method == "POST":
+            return self.graphql(body["query"], body.get("variables") or {})
+        match = re.fullmatch(
+            r"/repos/([^/]+)/([^/]+)"
+            r"(?:/pulls(?:/(\d+))?|/commits/(\w+)/(check-runs|status))?",
+            path,
+        )
+        if not match or match[1] != self.org or match[2] not in self.repos:
+            return 404, {"message": "Not Found"}
+        if match[5] == "check-runs":
+            return self.check_runs(match[2], match[4])
+        if match[5] == "status":
+            return self.commit_status(match[2], match[4])
+        if match[3]:
+            pull = self.find_pull(match[2], lambda p: p["number"] == int(match[3]))
+            return (
+                (200, self.pull_json(pull)) if pull else (404, {"message": "Not Found"})
+            )
+        if not match[0].endswith("/pulls"):
+            return 200, self.repo_json(match[2])
+        if method == "POST":
+            pull = self.new_pull(
+                len(self.pulls) + 1,
+                match[2],
+                body["head"],
+                body["title"],
+                body.get("draft", False),
+            )
+            self.pulls.append(pull)
+            return 201, self.pull_json(pull)
+        return 405, {"message": "Method not allowed"}
+
+    def find_pull(self, repository, predicate):
+        return next(
+            (p for p in self.pulls if p["repository"] == repository and predicate(p)),
+            None,
+        )
+
+    def check_runs(self, repository, sha):
+        pull = self.find_pull(repository, lambda p: p["sha"] == sha)
+        if pull is None:
+            return 404, {"message": "No commit found"}
+        done = pull["checks"] in ("SUCCESS", "FAILURE", "ERROR")
+        run = {
+            "id": pull["number"],
+            "name": "ci",
+            "head_sha": sha,
+            "status": "completed" if done else "in_progress",
+            "conclusion": pull["checks"].lower() if done else None,
+        }
+        return 200, {"total_count": 1, "check_runs": [run]}
+
+    def commit_status(self, repository, sha):
+        pull = self.find_pull(repository, lambda p: p["sha"] == sha)
+        if pull is None:
+            return 404, {"message": "No commit found"}
+        state = {"SUCCESS": "success", "FAILURE": "failure", "ERROR": "error"}
+        return 200, {
+            "sha": sha,
+            "state": state.get(pull["checks"], "pending"),
+            "total_count": 1,
+            "statuses": [],
+        }
+
+    def graphql(self, query, variables):
+        heads = re.findall(
+            r"(\w+): repository\(owner: \$(\w+), name: \$(\w+)\) \{"
+            r" pullRequests\(headRefName: \$(\w+)",
+            query,
+        )
+        if heads:
+            data = dict(self.pull_states(heads, variables))
+            errors = [
+                {"type": "NOT_FOUND", "path": [alias], "message": "Could not resolve"}
+                for alias, value in data.items()
+                if value is None
+            ]
+            return 200, {"data": data, **({"errors": errors} if errors else {})}
+        if "search(" not in query:
+            return 200, {"errors": [{"message": "Unsupported query"}]}
+        start = int(variables.get("cursor") or 0)
+        size = int(re.search(r"first:\s*(\d+)", query)[1])
+        open_pulls = [p for p in self.pulls if p["state"] == "open"]
+        nodes = [
+            {
+                "number": p["number"],
+                "title": p["title"],
+                "url": self.pull_json(p)["html_url"],
+                "isDraft": p["draft"],
+                "reviewDecision": p["review"],
+                "headRefOid": p["sha"],
+                "repository": {"name": p["repository"]},
+                "commits": {
+                    "nodes": [{"commit": {"statusCheckRollup": {"state": p["checks"]}}}]
+                },
+            }
+            for p in open_pulls[start : start + size]
+        ]
+        has_next = start + size < len(open_pulls)
+        return 200, {
+            "data": {
+                "search": {
+                    "pageInfo": {
+                        "hasNextPage": has_next,
+                        "endCursor": str(start + size) if has_next else None,
+                    },
+                    "nodes": nodes,
+                }
+            }
+        }
+
+    def pull_states(self, heads, variables):
+        """Answer the aliased `repository { pullRequests(headRefName:) }` fields."""
+        for alias, owner, name, head in heads:
+            owner, name, head = variables[owner], variables[name], variables[head]
+            if owner != self.org or name not in self.repos:
+                yield alias, None
+                continue
+            nodes = [
+                {"state": "MERGED" if p["merged"] else p["state"].upper()}
+                for p in self.pulls
+                if p["repository"] == name and p["head"] == head
+            ]
+            yield alias, {"pullRequests": {"nodes": nodes}}
@@ -0,0 +1,107 @@
+"""Measure how long purely local robota commands take to start.
+
+Usage:
+    python benchmarks/startup.py [--runs 20] [--max-ms 150] [command ...]
+
+Each command runs in a fresh interpreter, exactly like `run.sh` does, and the
+median wall time is reported. Heavy modules that show up in `-X importtime`
+output are listed, so that a regression can be traced to the import that caused
+it. Exits with status 1 if any median exceeds `--max-ms`.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_COMMANDS = [["help"], ["done"], ["o"]]
+
+# Modules that must never be imported by local commands.
+HEAVY_MODULES = ["jira", "github", "rich", "requests", "slugify"]
+
+
+def bench_env(workdir):
+    # Everything robota writes stays in `workdir`, and a daemon that happens to
+    # be running is not used.
+    env = {
+        name: value
+        for name, value in os.environ.items()
+        if name not in ("STORE_FILE", "MIRROR_DIR", "DAEMON_SOCKET")
+    }
+    env.update(
+        {
+            "ROBOTA_CODE_DIR": workdir,
+            "STATE_FILE": os.path.join(workdir, "state.json"),
+            "CACHE_DIR": os.path.join(workdir, "cache"),
+            "CHECKOUT_DIR": os.path.join(workdir, "checkout"),
+            "GITHUB_REPOS": "repo-a,repo-b",
+            "GITHUB_ORG": "bench-org",
+            "JIRA_HOST": "http://127.0.0.1:9",
+        }
+    )
+    return env
+
+
+def time_command(args, env):
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "robota", *args],
+        cwd=REPO_ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def heavy_imports(args, env):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "robota", *args],
+        cwd=REPO_ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    found = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[12:].split("|")]
+        if name in HEAVY_MODULES:
+            found[name] = int(cumulative) / 1000
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--max-ms", type=float, default=None)
+    parser.add_argument("command", nargs="*")
+    options = parser.parse_args()
+
+    commands = [options.command] if options.command else DEFAULT_COMMANDS
+    failed = False
+    with tempfile.TemporaryDirectory() as workdir:
+        env = bench_env(workdir)
+        for args in commands:
+            timings = [time_command(args, env) for _ in range(options.runs)]
+            median = statistics.median(timings)
+            print(
+                f"{' '.join(args):<10} median {median:7.1f} ms"
+                f"  min {min(timings):7.1f} ms  max {max(timings):7.1f} ms"
+            )
+            for name, ms in heavy_imports(args, env).items():
+                print(f"    imports {name} ({ms:.1f} ms)")
+            if options.max_ms is not None and median > options.max_ms:
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
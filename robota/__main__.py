@@ -1,15 +1,23 @@
 import os
 import sys
 
+from . import trace  # first, so that the startup span covers the other imports
 from .command import command
-from .repl import loop
+from .daemon import forward
+
+trace.imported()
 
 # print(f"env for dir is ROBOTA_CODE_DIR: {os.getenv('ROBOTA_CODE_DIR')}, and argv is {sys.argv}")
 
 if len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == "repl"):
+    from .repl import loop
+
     loop()
     sys.exit(0)
 
 
 os.chdir(os.getenv("ROBOTA_CODE_DIR"))
-sys.exit(command(*(sys.argv[1:])))
+exit_code = forward(sys.argv[1:])
+if exit_code is None:
+    exit_code = command(*(sys.argv[1:]))
+sys.exit(exit_code)
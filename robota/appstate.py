@@ -1,22 +1,40 @@
 import json
 import os
+
+from . import store
 from .env import STATE_FILE
 
-state = {}
-if os.path.exists(STATE_FILE):
-    with open(STATE_FILE) as f:
-        state = json.load(f)
+NAMESPACE = "state"
 
 
 def set(key: str, value: any):
-    state[key] = value
-    save()
+    _import_state_file()
+    store.set(NAMESPACE, key, value)
 
 
 def get(key, default=None):
-    return state.get(key, default)
+    _import_state_file()
+    return store.get(NAMESPACE, key, default)
 
 
-def save():
-    with open(STATE_FILE, "w") as f:
-        json.dump(state, f)
+def _import_state_file():
+    """Copy the settings of the JSON state file into the store when it changes.
+
+    Older versions kept their state in this file, and it is still where
+    settings like CLONE_PROFILES are edited by hand. The values of an edited
+    file replace those in the store, including ones set with `org`.
+    """
+    if not STATE_FILE or not os.path.exists(STATE_FILE):
+        return
+    path = os.path.abspath(STATE_FILE)
+    modified = os.stat(path).st_mtime_ns
+    # Keyed by the file's path, so that pointing STATE_FILE elsewhere imports it
+    marker = f"state_file_imported:{path}"
+    if store.get("meta", marker) == modified:
+        return
+    with open(path) as f:
+        state = json.load(f)
+    with store.transaction():
+        for key, value in state.items():
+            store.set(NAMESPACE, key, value)
+        store.set("meta", marker, modified)
@@ -0,0 +1,196 @@
+import fcntl
+import os
+import shutil
+import subprocess
+from contextlib import contextmanager
+
+from . import appstate, gitmeta, trace
+from .env import CHECKOUT_MODE, CLONE_PROFILES, MIRROR_DIR
+from .errors import RobotaError
+
+# The progress steps of a checkout, for each CHECKOUT_MODE
+CHECKOUT_STEPS = {
+    "worktree": ["fetch", "worktree"],
+    "reference": ["fetch", "clone", "checkout"],
+    "clone": ["clone", "checkout"],
+}
+
+
+def checkout_steps():
+    """The steps that `checkout_repo` reports in the configured CHECKOUT_MODE."""
+    if CHECKOUT_MODE not in CHECKOUT_STEPS:
+        raise RobotaError(
+            f"CHECKOUT_MODE must be one of {', '.join(CHECKOUT_STEPS)},"
+            f" not {CHECKOUT_MODE!r}"
+        )
+    return CHECKOUT_STEPS[CHECKOUT_MODE]
+
+
+def run_git(args, cwd=None):
+    """Run a git command, raising RobotaError with its stderr if it fails."""
+    with trace.span("git", f"git {args[0]}", cwd=cwd):
+        result = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RobotaError(
+            f"git {' '.join(args)} failed with {result.returncode}: {result.stderr.strip()}"
+        )
+    return result.stdout.strip()
+
+
+def repo_url(org, repo):
+    return f"git@github.com:{org}/{repo}.git"
+
+
+def mirror_path(org, repo):
+    return os.path.join(MIRROR_DIR, org, f"{repo}.git")
+
+
+def clone_profile(org, repo):
+    """Look up the clone profile for a repo; the state file overrides the env.
+
+    A profile may set "filter" (a partial clone filter such as "blob:none" or
+    "tree:0"), "depth" (for shallow history) and "sparse" (a list of directories
+    to check out, in cone mode). Repos without a profile are cloned in full.
+    """
+    profiles = appstate.get("CLONE_PROFILES") or CLONE_PROFILES
+    return profiles.get(f"{org}/{repo}") or profiles.get(repo) or {}
+
+
+def _clone_args(profile):
+    args = []
+    if profile.get("filter"):
+        args.append(f"--filter={profile['filter']}")
+    if profile.get("depth"):
+        # --depth implies --single-branch, which would hide existing story branches
+        args.extend([f"--depth={profile['depth']}", "--no-single-branch"])
+    return args
+
+
+@contextmanager
+def _locked(path):
+    """Serialize mirror updates between concurrent robota processes."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def update_mirror(org, repo, profile=None):
+    """Create or refresh the local bare mirror of `org/repo`, returning its path.
+
+    The mirror keeps GitHub's branches under refs/remotes/origin, exactly like a
+    regular clone, so that worktrees created from it can push to origin as usual.
+    The clone profile's filter and depth only apply when the mirror is created;
+    later fetches keep whatever the mirror was created with.
+    """
+    path = mirror_path(org, repo)
+    with _locked(path):
+        if os.path.exists(path):
+            run_git(["worktree", "prune"], cwd=path)
+            run_git(["fetch", "--prune", "origin"], cwd=path)
+            return path
+
+        # Clone next to the final location and rename it into place when done,
+        # so that an interrupted clone never looks like a usable mirror.
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        run_git(
+            [
+                "clone",
+                "--bare",
+                *_clone_args(profile or {}),
+                repo_url(org, repo),
+                tmp_path,
+            ]
+        )
+        run_git(
+            ["config", "remote.origin.fetch", "+refs/heads/*:refs/remotes/origin/*"],
+            cwd=tmp_path,
+        )
+        run_git(["fetch", "--prune", "origin"], cwd=tmp_path)
+        default_branch = run_git(["symbolic-ref", "--short", "HEAD"], cwd=tmp_path)
+        run_git(
+            [
+                "symbolic-ref",
+                "refs/remotes/origin/HEAD",
+                f"refs/remotes/origin/{default_branch}",
+            ],
+            cwd=tmp_path,
+        )
+        os.rename(tmp_path, path)
+    return path
+
+
+def checkout_repo(workdir_path, org, repo, branchname, on_step=lambda step: None):
+    """Check out `org/repo` into the workspace on the story branch.
+
+    Depending on CHECKOUT_MODE, the workspace is a worktree of the local mirror,
+    a clone that borrows objects from the mirror, or a plain clone from GitHub.
+    The repo's clone profile is applied in every mode. `on_step` is called with
+    the name of each step as it starts, so that the caller can report progress;
+    it may be called from a worker thread.
+    """
+    checkout_steps()  # validates CHECKOUT_MODE
+    repo_path = os.path.abspath(os.path.join(workdir_path, repo))
+    profile = clone_profile(org, repo)
+    sparse = profile.get("sparse")
+
+    if CHECKOUT_MODE == "worktree":
+        on_step("fetch")
+        mirror = update_mirror(org, repo, profile)
+        on_step("worktree")
+        start = _remote_branch(mirror, branchname)
+        no_checkout = ["--no-checkout"] if sparse else []
+        run_git(
+            ["worktree", "add", *no_checkout, "-B", branchname, repo_path, *start],
+            cwd=mirror,
+        )
+        if sparse:
+            run_git(["sparse-checkout", "set", "--cone", *sparse], cwd=repo_path)
+            run_git(["reset", "--quiet", "--hard"], cwd=repo_path)
+        return repo_path
+
+    clone_args = _clone_args(profile)
+    if CHECKOUT_MODE == "reference":
+        on_step("fetch")
+        if not clone_args:
+            # A shallow or partial mirror can't serve as a reference, so repos
+            # with such a profile are cloned from GitHub with the profile instead.
+            # --dissociate copies the borrowed objects, so that pruning the
+            # mirror later can't corrupt the workspace.
+            clone_args = ["--reference", update_mirror(org, repo), "--dissociate"]
+    if sparse:
+        clone_args.append("--sparse")
+
+    on_step("clone")
+    run_git(["clone", *clone_args, repo_url(org, repo), repo], cwd=workdir_path)
+
+    on_step("checkout")
+    if sparse:
+        run_git(["sparse-checkout", "set", "--cone", *sparse], cwd=repo_path)
+    run_git(
+        ["checkout", "-B", branchname, *_remote_branch(repo_path, branchname)],
+        cwd=repo_path,
+    )
+    return repo_path
+
+
+def workspace_repos(workdir_path):
+    """Paths of the repositories checked out in a story workspace."""
+    return [
+        path
+        for path in sorted(
+            os.path.join(workdir_path, name) for name in os.listdir(workdir_path)
+        )
+        if os.path.exists(os.path.join(path, ".git"))
+    ]
+
+
+def _remote_branch(repo_path, branchname):
+    """Start from the remote story branch if someone already pushed it."""
+    if gitmeta.ref_exists(repo_path, f"refs/remotes/origin/{branchname}"):
+        return [f"origin/{branchname}"]
+    return ["--no-track", "origin/HEAD"]
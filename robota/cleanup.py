@@ -0,0 +1,124 @@
+"""Removal of story workspaces that are no longer needed.
+
+Deleting a workspace with its dependencies and build outputs can take long, so
+a workspace is first renamed into CHECKOUT_DIR/.trash, which is instant and
+atomic, and then deleted by a detached process that outlives the command.
+"""
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .env import CHECKOUT_DIR
+from .errors import RobotaError
+from .github import get_pull_states, get_repo_name
+from .jira import get_issues
+from .status import scan
+
+ISSUE_KEY = re.compile(r"[A-Z][A-Z0-9_]*-\d+")
+
+# Run by the background process: delete the directories given as arguments
+DELETE_SCRIPT = """
+import shutil, sys
+from concurrent.futures import ThreadPoolExecutor
+list(ThreadPoolExecutor().map(lambda p: shutil.rmtree(p, ignore_errors=True), sys.argv[1:]))
+"""
+
+
+def trash_dir():
+    return os.path.join(CHECKOUT_DIR, ".trash")
+
+
+def trash(workspace):
+    """Move a workspace into the trash, returning its new path."""
+    os.makedirs(trash_dir(), exist_ok=True)
+    name = f"{os.path.basename(workspace)}-{time.time_ns()}"
+    target = os.path.join(trash_dir(), name)
+    os.rename(workspace, target)
+    return target
+
+
+def empty_trash():
+    """Delete everything in the trash, including leftovers of interrupted deletions, in the background."""
+    if not os.path.isdir(trash_dir()):
+        return
+    paths = [entry.path for entry in os.scandir(trash_dir())]
+    if paths:
+        subprocess.Popen(
+            [sys.executable, "-c", DELETE_SCRIPT, *paths],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+
+def _repo_name(path):
+    try:
+        return get_repo_name(path)
+    except RobotaError:  # no GitHub origin
+        return None
+
+
+def gc_plan():
+    """(workspace, Issue or None, PR states, reason to keep it) for each workspace.
+
+    The reason is None for workspaces that can be reclaimed: the story is
+    resolved, no repository has local changes or unpushed commits, and every PR
+    of every repository is merged. All repositories are scanned
+    without the status cache, and then a single Jira query and a single GitHub
+    query, made concurrently, cover every workspace.
+    """
+    statuses = scan(use_cache=False)
+    repos = [repo for repos in statuses.values() for repo in repos]
+    keys = {workspace: os.path.basename(workspace).upper() for workspace in statuses}
+    with ThreadPoolExecutor() as pool:
+        paths = [repo.path for repo in repos]
+        names = dict(zip(paths, pool.map(_repo_name, paths)))
+        heads = {
+            repo.path: (names[repo.path], repo.branch)
+            for repo in repos
+            if names[repo.path] and repo.branch
+        }
+        issues = pool.submit(
+            get_issues, [key for key in keys.values() if ISSUE_KEY.fullmatch(key)]
+        )
+        pulls = pool.submit(get_pull_states, list(heads.values()))
+        issues, pulls = issues.result(), pulls.result()
+
+    plan = []
+    for workspace, workspace_repos in statuses.items():
+        issue = issues.get(keys[workspace])
+        states = {
+            repo.path: pulls.get(heads.get(repo.path), []) for repo in workspace_repos
+        }
+        plan.append(
+            (
+                workspace,
+                issue,
+                [state for repo_states in states.values() for state in repo_states],
+                _keep_reason(keys[workspace], issue, workspace_repos, states),
+            )
+        )
+    return plan
+
+
+def _keep_reason(key, issue, repos, states):
+    if issue is None:
+        return f"no Jira story {key}"
+    if not issue.resolution:
+        return f"story is {issue.status}"
+    for repo in repos:
+        name = os.path.basename(repo.path)
+        if repo.error:
+            return f"{name}: {repo.error}"
+        if repo.changed or repo.untracked:
+            return f"{name}: uncommitted changes"
+        unmerged = [state for state in states[repo.path] if state != "MERGED"]
+        if unmerged:
+            return f"{name}: PR {unmerged[0].lower()}"
+        if repo.ahead:
+            return f"{name}: unpushed commits"
+    return None
@@ -1,35 +1,51 @@
 import os
-import shutil
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import wraps
 from traceback import print_exc
 
-from rich.console import Console
-
-from robota.repl_github import evaluate_prs, evaluate_workon
-from robota.repl_jira import (
-    evaluate_boards,
-    evaluate_list,
-    evaluate_projects,
-    evaluate_sprint_issues,
-    evaluate_sprints,
-    evaluate_unestimated,
-)
-
 from .env import CHECKOUT_DIR
+from . import trace
 from .errors import RobotaError
+from .checkout import workspace_repos
 from .github import (
-    commit_all_and_push,
+    commit_and_push,
     create_pull,
     get_current_branch,
-    is_current_directory_clean,
+    get_repo,
+    get_repo_name,
+    github_org,
+    has_changes,
+    push_and_open_pr,
+    stage_all,
 )
 from .jira import add_comment_to_issue, get_issue, set_issue_status
+from .timing import Stages
 
-console = Console()
+# `rich` and the repl_* modules are imported inside the commands that need them,
+# so that local commands like `help` and `done` start instantly.
 
 commands = {}
 
+_console = None
+
+
+def console():
+    """The console that commands render to."""
+    global _console
+    if _console is None:
+        from rich.console import Console
+
+        _console = Console()
+    return _console
+
+
+def set_console(new_console):
+    """Make commands render to a different console, returning the previous one."""
+    global _console
+    previous, _console = _console, new_console
+    return previous
+
 
 def make_command(*args):
     def decorator(func):
@@ -46,8 +62,24 @@ def make_command(*args):
 
 
 def command(*args):
-    """Run a shell command"""
-    cmd = args[0]
+    """Run a shell command, profiled if `--profile` or `--trace-file=` is given"""
+    args, profile, trace_file = trace.split_flags(args)
+    if not (profile or trace_file):
+        return run_command(*args)
+    trace.start()
+    try:
+        return run_command(*args)
+    finally:
+        trace.stop()
+        if profile:
+            trace.report()
+        if trace_file:
+            trace.write_chrome_trace(trace_file)
+            print(f"Trace written to {trace_file}")
+
+
+def run_command(*args):
+    cmd = args[0] if args else "help"
     cmdargs = args[1:]
     default_handler = lambda *a: unknown_command(cmd, *a)
     try:
@@ -55,7 +87,13 @@ def command(*args):
     except RobotaError as rerr:
         print(f"Exiting for the following reason: {rerr}")
         return 42
-    except:
+    except BaseException as err:
+        from .transport import transient_error_message
+
+        message = transient_error_message(err)
+        if message:
+            print(f"Exiting for the following reason: {message}")
+            return 1
         print("Unexpected error:")
         print_exc()
         return 1
@@ -78,52 +116,161 @@ def make_pr(commit_message=None, ready_for_review=False, no_jira=False):
     To create a draft PR:
     > robota pr "optional commit message'
     """
-    current_branch = get_current_branch()
-    if no_jira:
-        if not commit_message:
-            raise RobotaError("Without Jira, commit message is required")
-        commit_header = commit_message
-    else:
-        jira_story_id = "-".join(current_branch.split("-")[1:3]).upper()
-        jira_story = get_issue(jira_story_id)
-        jira_story_title = jira_story.fields.summary
-        commit_header = f"[{jira_story_id}] {jira_story_title}"
-    push_msg = commit_header
-    if commit_message:
-        push_msg += f"\\n{commit_message}"
-    print(f"Ready to commit and push with locals", locals())
-    # return
-    commit_all_and_push(push_msg)
-    pr_text = (
-        no_jira
-        and commit_message
-        or f"This PR is related to Jira story: {jira_story.permalink()}"
-    )
-    pr = create_pull(commit_header, pr_text, not ready_for_review)
-    if not no_jira:
-        jira_comment = f"PR: {pr.html_url}"
-        add_comment_to_issue(jira_story_id, jira_comment)
+    if no_jira and not commit_message:
+        raise RobotaError("Without Jira, commit message is required")
+
+    stages = Stages()
+    with stages.stage("git metadata"):
+        current_branch = get_current_branch()
+        repo_name = get_repo_name()
+
+    # Only the read-only GitHub lookup overlaps the Jira lookup and the push.
+    # Nothing is staged until the story is known to exist.
+    with ThreadPoolExecutor() as pool:
+        repo = pool.submit(stages.timed("github repo", get_repo), repo_name)
+        if no_jira:
+            commit_header = commit_message
+        else:
+            jira_story_id = "-".join(current_branch.split("-")[1:3]).upper()
+            with stages.stage("jira issue"):
+                jira_story = get_issue(jira_story_id)
+            jira_story_title = jira_story.summary
+            commit_header = f"[{jira_story_id}] {jira_story_title}"
+        push_msg = commit_header
+        if commit_message:
+            push_msg += f"\n\n{commit_message}"
+        with stages.stage("git add"):
+            stage_all()
+        with stages.stage("commit and push"):
+            commit_and_push(push_msg, current_branch)
+        pr_text = (
+            no_jira
+            and commit_message
+            or f"This PR is related to Jira story: {jira_story.url}"
+        )
+        with stages.stage("pull request"):
+            pr = create_pull(
+                commit_header,
+                pr_text,
+                not ready_for_review,
+                branch=current_branch,
+                repo=repo.result(),
+            )
+        if not no_jira:
+            jira_comment = f"PR: {pr.html_url}"
+            status = "In Review" if ready_for_review else "In Progress"
+            with stages.stage("jira update"):
+                updates = [
+                    pool.submit(
+                        stages.timed("jira comment", add_comment_to_issue),
+                        jira_story_id,
+                        jira_comment,
+                    ),
+                    pool.submit(
+                        stages.timed("jira status", set_issue_status),
+                        jira_story,
+                        status,
+                    ),
+                ]
+                for update in updates:
+                    update.result()
+    stages.report()
+
+
+@make_command("pr-all")
+def make_workspace_prs(commit_message=None, ready_for_review=False):
+    """Commit and push every changed repo in the current story workspace, create a PR for each, then add one Jira comment listing them all and mark the Jira story as "In Progress" or "In Review".
+
+    > robota pr-all "optional commit message" ready
+    """
+    workspace = current_workspace()
+    jira_story_id = os.path.basename(workspace).upper()
+
+    stages = Stages()
+    with ThreadPoolExecutor() as pool:
+        story = pool.submit(stages.timed("jira issue", get_issue), jira_story_id)
+        with stages.stage("find changes"):
+            changed = [path for path in workspace_repos(workspace) if has_changes(path)]
+        if not changed:
+            raise RobotaError(f"No repository in {workspace} has changes")
+
+        jira_story = story.result()
+        commit_header = f"[{jira_story_id}] {jira_story.summary}"
+        push_msg = commit_header
+        if commit_message:
+            push_msg += f"\n\n{commit_message}"
+        pr_text = f"This PR is related to Jira story: {jira_story.url}"
+
+        futures = {
+            pool.submit(
+                stages.timed(f"pr {os.path.basename(path)}", push_and_open_pr),
+                push_msg,
+                commit_header,
+                pr_text,
+                not ready_for_review,
+                cwd=path,
+            ): os.path.basename(path)
+            for path in changed
+        }
+        prs = []
+        for future in as_completed(futures):
+            try:
+                prs.append(future.result())
+            except Exception as err:  # keep the PRs of the other repos
+                print(f"Could not create a PR for {futures[future]}: {err}")
+        if not prs:
+            raise RobotaError("No pull requests were created")
+
+        jira_comment = "PRs:\n" + "\n".join(f"- {pr.html_url}" for pr in prs)
         status = "In Review" if ready_for_review else "In Progress"
-        set_issue_status(jira_story_id, status)
+        with stages.stage("jira update"):
+            updates = [
+                pool.submit(add_comment_to_issue, jira_story_id, jira_comment),
+                pool.submit(set_issue_status, jira_story, status),
+            ]
+            for update in updates:
+                update.result()
+    stages.report()
 
 
 @make_command("help", "h")
 def help():
     """Print this help screen"""
-    console.print("Available commands:")
+    print("Available commands:")
     grouped_evaluators = defaultdict(list)
     for name, fn in commands.items():
         grouped_evaluators[fn].append(name)
     for fn, names in grouped_evaluators.items():
-        console.print(f"  {', '.join(names)}: {commands[names[0]].__doc__}")
+        print(f"  {', '.join(names)}: {commands[names[0]].__doc__}")
+    print(
+        f"Add {trace.PROFILE_FLAG} to any command for a timing breakdown,"
+        f" or {trace.TRACE_FILE_FLAG}PATH to save a Chrome trace."
+    )
 
 
 @make_command("done")
 def done(*_args):  # args are ignored
-    """Clean up current directory and remove working files."""
-    if not is_current_directory_clean():
-        raise RobotaError("Cannot clean up directory that has local changes!")
-
+    """Clean up current directory and remove working files (in the background)."""
+    from .cleanup import empty_trash, trash
+    from .status import scan
+
+    workspace = current_workspace()
+    dirty = [
+        repo for repo in scan([workspace], use_cache=False)[workspace] if not repo.clean
+    ]
+    if dirty:
+        names = ", ".join(os.path.basename(repo.path) for repo in dirty)
+        raise RobotaError(
+            f"Cannot clean up a workspace with local changes or unpushed commits: {names}"
+        )
+
+    trash(workspace)
+    empty_trash()
+    print(f"Removed {workspace}")
+
+
+def current_workspace():
+    """The story workspace under CHECKOUT_DIR that contains the current directory."""
     current_dir = os.getcwd()
 
     # Define the workspace root
@@ -133,56 +280,130 @@ def done(*_args):  # args are ignored
         raise RobotaError(f"Not a workspace directory: {current_dir}")
 
     project_dir = current_dir[len(workspace_root) + 1 :].split(os.sep)[0]
-    project_path = os.path.join(workspace_root, project_dir)
+    return os.path.join(workspace_root, project_dir)
+
+
+@make_command("o")
+def org(*args):
+    """Get or set the GitHub organization"""
+    print(f"Current GitHub organization: {github_org(*args[:1])}")
+
+
+@make_command("daemon")
+def daemon(*args):
+    """Run the robota daemon in the foreground, or stop it.
+
+    While the daemon runs, other robota commands are forwarded to it and reuse
+    its warm Jira and GitHub connections.
+    > robota daemon
+    > robota daemon stop
+    """
+    from .daemon import serve, stop
+
+    return stop() if args[:1] == ("stop",) else serve()
 
-    shutil.rmtree(project_path)
+
+@make_command("gc")
+def collect_garbage(*args):
+    """Remove all workspaces whose stories are resolved and PRs merged (`gc --dry-run` to only list them)"""
+    from .repl_github import evaluate_gc
+
+    return evaluate_gc(console(), ["gc", *args])
+
+
+@make_command("watch")
+def watch(*args):
+    """Print changes to my Jira stories and GitHub PRs as they happen (`watch --notify` for desktop notifications)"""
+    from .watch import evaluate_watch
+
+    return evaluate_watch(console(), ["watch", *args])
+
+
+@make_command("status")
+def workspace_status(*args):
+    """Show uncommitted changes and unpushed commits in all story workspaces (`status -f` to skip the cache)"""
+    from .repl_github import evaluate_status
+
+    return evaluate_status(console(), ["status", *args])
 
 
 @make_command("w")
 def workon(*args):
     """Start working on a specific Jira story, with optional repository"""
+    from .repl_github import evaluate_workon
+
     ast = ["w"]
     ast.extend(args)
-    return evaluate_workon(console, ast)
+    return evaluate_workon(console(), ast)
 
 
 @make_command("l")
-def list_stories(*_args):
-    """List Jira stories assigned to me"""
-    return evaluate_list(console, [])
+def list_stories(*args):
+    """List Jira stories assigned to me (`l -f` to refresh now)"""
+    from .repl_jira import evaluate_list
+
+    return evaluate_list(console(), ["l", *args])
 
 
 @make_command("p")
-def list_pulls(*_args):
-    """List my open PRs on GitHub"""
-    return evaluate_prs(console, [])
+def list_pulls(*args):
+    """List my open PRs on GitHub (`p -f` to refresh now)"""
+    from .repl_github import evaluate_prs
+
+    return evaluate_prs(console(), ["p", *args])
 
 
 @make_command("projects")
 def list_projects():
     """List the projects from Jira"""
-    return evaluate_projects(console, [])
+    from .repl_jira import evaluate_projects
+
+    return evaluate_projects(console(), [])
 
 
 @make_command("boards")
 def list_boards():
     """List the boards from Jira"""
-    return evaluate_boards(console, [])
+    from .repl_jira import evaluate_boards
+
+    return evaluate_boards(console(), [])
 
 
 @make_command("sprints")
 def list_sprints(*args):
     """List the sprints for a board"""
-    return evaluate_sprints(console, args)
+    from .repl_jira import evaluate_sprints
+
+    return evaluate_sprints(console(), args)
 
 
 @make_command("sprint-issues")
 def list_sprint_issues(*args):
     """List the issues for a sprint"""
-    return evaluate_sprint_issues(console, args)
+    from .repl_jira import evaluate_sprint_issues
+
+    return evaluate_sprint_issues(console(), args)
+
+
+@make_command("sprint", "s")
+def sprint_dashboard(*board_ids):
+    """Show the active sprints of the given boards (all Scrum boards if none), grouped by status and owner"""
+    from .repl_jira import evaluate_sprint
+
+    return evaluate_sprint(console(), ["s", *board_ids])
+
+
+@make_command("find", "f")
+def find_issues(*words):
+    """Search the Jira issues fetched so far by key, summary, status or assignee, without going online"""
+    from .repl_jira import evaluate_find
+
+    return evaluate_find(console(), ["f", *words])
 
 
 @make_command("unestimated")
 def list_unestimated(*args):
-    """List the unestimated issues for a board"""
-    return evaluate_unestimated(console, args)
+    """List the unestimated issues for one or more boards"""
+    from .repl_jira import evaluate_unestimated
+
+    return evaluate_unestimated(console(), args)
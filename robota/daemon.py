@@ -0,0 +1,172 @@
+"""An optional long-lived robota process that keeps clients and caches warm.
+
+`robota daemon` listens on a Unix socket. While it runs, the CLI forwards each
+command to it together with the current directory, and prints the output that
+streams back, so a command costs one local round trip instead of a cold start
+and a fresh Jira/GitHub handshake. Without a daemon, commands run in-process.
+"""
+import json
+import os
+import shutil
+import socket
+import sys
+
+from .env import DAEMON_SOCKET
+
+# Commands that need the user's terminal (prompts, launching the IDE), that
+# manage the daemon, that run until interrupted, or that are local and instant
+# anyway, are never forwarded.
+LOCAL_COMMANDS = {"daemon", "w", "watch", "help", "h", "done", "o"}
+
+
+def forward(args):
+    """Run a command in the daemon and return its exit code, or None if there is no daemon."""
+    if not args or args[0] in LOCAL_COMMANDS:
+        return None
+    try:
+        sock = _connect()
+    except OSError:
+        return None
+    request = {
+        "args": list(args),
+        "cwd": os.getcwd(),
+        "width": shutil.get_terminal_size().columns,
+        "terminal": sys.stdout.isatty(),
+    }
+    with sock, sock.makefile("rwb") as stream:
+        stream.write(json.dumps(request).encode() + b"\n")
+        stream.flush()
+        for line in stream:
+            message = json.loads(line)
+            if "out" in message:
+                sys.stdout.write(message["out"])
+                sys.stdout.flush()
+            elif "exit" in message:
+                return message["exit"]
+    print("The robota daemon exited before the command finished")
+    return 1
+
+
+def stop():
+    try:
+        with _connect() as sock:
+            sock.sendall(json.dumps({"stop": True}).encode() + b"\n")
+            sock.recv(1)
+    except OSError:
+        print("The robota daemon is not running")
+        return 1
+
+
+def _connect():
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(DAEMON_SOCKET)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+class _StreamWriter:
+    """A file-like object that forwards writes to the client as messages."""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.connected = True
+
+    def write(self, text):
+        self.send({"out": text})
+        return len(text)
+
+    def send(self, message):
+        if not self.connected:
+            return
+        try:
+            self.wfile.write(json.dumps(message).encode() + b"\n")
+            self.wfile.flush()
+        except OSError:
+            self.connected = False  # the client went away; finish the command anyway
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def serve():
+    """Serve forwarded commands until `robota daemon stop` or Ctrl-C."""
+    import threading
+    from contextlib import redirect_stderr, redirect_stdout
+    from socketserver import StreamRequestHandler, ThreadingUnixStreamServer
+
+    from rich.console import Console
+
+    from . import trace
+    from .command import command, set_console
+
+    # A profiled command should not include the daemon's own startup
+    trace.forget_startup()
+
+    # Commands change the working directory and redirect stdout, which are
+    # process-wide, so they run one at a time.
+    command_lock = threading.Lock()
+
+    class Handler(StreamRequestHandler):
+        def handle(self):
+            line = self.rfile.readline()
+            if not line:
+                return  # a connection only checking that the daemon is running
+            request = json.loads(line)
+            if request.get("stop"):
+                self.wfile.write(b"\n")
+                threading.Thread(target=server.shutdown).start()
+                return
+            out = _StreamWriter(self.wfile)
+            with command_lock:
+                daemon_cwd = os.getcwd()
+                try:
+                    os.chdir(request["cwd"])
+                except OSError as err:
+                    out.write(f"Cannot run in {request['cwd']}: {err.strerror}\n")
+                    out.send({"exit": 1})
+                    return
+                previous = set_console(
+                    Console(
+                        file=out,
+                        width=request["width"],
+                        force_terminal=request["terminal"],
+                    )
+                )
+                try:
+                    with redirect_stdout(out), redirect_stderr(out):
+                        exit_code = command(*request["args"])
+                finally:
+                    set_console(previous)
+                    os.chdir(daemon_cwd)
+            out.send({"exit": exit_code or 0})
+
+    try:
+        _connect().close()
+    except OSError:
+        if os.path.exists(DAEMON_SOCKET):
+            os.unlink(DAEMON_SOCKET)  # left behind by a daemon that crashed
+    else:
+        print(f"The robota daemon is already running on {DAEMON_SOCKET}")
+        return 1
+
+    os.makedirs(os.path.dirname(DAEMON_SOCKET), mode=0o700, exist_ok=True)
+    # Only this user may connect, from the moment the socket exists
+    umask = os.umask(0o077)
+    try:
+        server = ThreadingUnixStreamServer(DAEMON_SOCKET, Handler)
+    finally:
+        os.umask(umask)
+    print(f"robota daemon listening on {DAEMON_SOCKET}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(DAEMON_SOCKET)
@@ -1,3 +1,4 @@
+import json
 import os
 
 from dotenv import load_dotenv
@@ -10,10 +11,44 @@ JIRA_API_TOKEN = os.getenv("JIRA_API_TOKEN")
 STATE_FILE = os.getenv("STATE_FILE")
 GITHUB_USERNAME = os.getenv("GITHUB_USERNAME")
 GITHUB_API_KEY = os.getenv("GITHUB_API_KEY")
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
 GITHUB_ORG = os.getenv("GITHUB_ORG")
 GITHUB_REPOS = os.getenv("GITHUB_REPOS").split(",")
 CHECKOUT_DIR = os.getenv("CHECKOUT_DIR")
+CHECKOUT_WORKERS = int(os.getenv("CHECKOUT_WORKERS", "4"))
+# One of "worktree", "reference" (both use the local mirrors) or "clone"
+CHECKOUT_MODE = os.getenv("CHECKOUT_MODE", "worktree")
+CACHE_DIR = os.getenv("CACHE_DIR") or os.path.expanduser("~/.cache/robota")
+MIRROR_DIR = os.getenv("MIRROR_DIR") or os.path.join(CACHE_DIR, "mirrors")
+STORE_FILE = os.getenv("STORE_FILE") or os.path.join(CACHE_DIR, "robota.sqlite3")
+DAEMON_SOCKET = os.getenv("DAEMON_SOCKET") or os.path.join(CACHE_DIR, "daemon.sock")
+# How long `robota status` may reuse the status of a repo whose git metadata
+# did not change, in seconds
+STATUS_TTL = int(os.getenv("STATUS_TTL", "60"))
+# How long a Jira issue, once fetched, is reused within one process, in seconds
+ISSUE_MEMO_TTL = int(os.getenv("ISSUE_MEMO_TTL", "60"))
+# How long Jira fields, transitions, projects and boards are cached, in seconds
+JIRA_METADATA_TTL = int(os.getenv("JIRA_METADATA_TTL", "86400"))
+# Sprints start and end more often, so their lists are refreshed sooner
+SPRINT_LIST_TTL = int(os.getenv("SPRINT_LIST_TTL", "900"))
+# Per-repo clone settings, as JSON keyed by "org/repo" or "repo", e.g.
+# {"monorepo": {"filter": "blob:none", "depth": 50, "sparse": ["services/api"]}}
+CLONE_PROFILES = json.loads(os.getenv("CLONE_PROFILES") or "{}")
+
+HTTP_TIMEOUT = int(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "4"))
+# `robota watch` polls every WATCH_INTERVAL seconds, slowing down to
+# WATCH_MAX_INTERVAL while nothing changes, and lists PRs again every
+# WATCH_REFRESH seconds to notice new ones
+WATCH_INTERVAL = int(os.getenv("WATCH_INTERVAL", "30"))
+WATCH_MAX_INTERVAL = int(os.getenv("WATCH_MAX_INTERVAL", "300"))
+WATCH_REFRESH = int(os.getenv("WATCH_REFRESH", "600"))
+# How often the REPL refreshes issues and PRs in the background, in seconds
+PREFETCH_INTERVAL = int(os.getenv("PREFETCH_INTERVAL", "60"))
 
 
 USER_NICKNAME = os.getenv("USER_NICKNAME")
 IDE_COMMAND = os.getenv("IDE_COMMAND")
+# Run with the repo path instead of open_terminal_at.sh, if set
+TERMINAL_COMMAND = os.getenv("TERMINAL_COMMAND")
@@ -1,15 +1,33 @@
-import os
 import subprocess
+from functools import cache
+from typing import NamedTuple
 
-from github import Github
-
-from . import appstate
-from .env import GITHUB_API_KEY
+from . import appstate, gitmeta, trace
+from .env import GITHUB_API_KEY, GITHUB_API_URL
 from .env import GITHUB_ORG as DEFAULT_ORG
 from .env import GITHUB_USERNAME
 from .errors import RobotaError
+from .lazy import once
+
+
+@once
+def client():
+    """Connect to GitHub on first use, so that local commands never pay for it."""
+    with trace.span("auth", "github client"):
+        from github import Github
+        from github.Requester import Requester
+
+        from . import transport
 
-github = Github(GITHUB_API_KEY)
+        # The client keeps the connection classes it was created with; restoring
+        # the defaults right away keeps its connections persistent.
+        Requester.injectConnectionClasses(*transport.github_connection_classes())
+        try:
+            return Github(
+                GITHUB_API_KEY, base_url=GITHUB_API_URL, **transport.github_options()
+            )
+        finally:
+            Requester.resetConnectionClasses()
 
 
 def github_org(new_org=None):
@@ -18,69 +36,170 @@ def github_org(new_org=None):
     return appstate.get("GITHUB_ORG", DEFAULT_ORG)
 
 
-def get_my_prs():
-    return list(
-        github.search_issues(
-            f"is:open is:pr author:{GITHUB_USERNAME} archived:false user:{github_org()}"
+class PullRequest(NamedTuple):
+    repository: str
+    number: int
+    title: str
+    html_url: str
+    draft: bool
+    review_decision: str | None  # APPROVED, CHANGES_REQUESTED or REVIEW_REQUIRED
+    checks: str | None  # SUCCESS, FAILURE, PENDING, ... for the last commit
+    head_sha: str | None = None
+
+    @classmethod
+    def from_graphql(cls, node):
+        commits = node["commits"]["nodes"]
+        rollup = commits[0]["commit"]["statusCheckRollup"] if commits else None
+        return cls(
+            repository=node["repository"]["name"],
+            number=node["number"],
+            title=node["title"],
+            html_url=node["url"],
+            draft=node["isDraft"],
+            review_decision=node["reviewDecision"],
+            checks=rollup["state"] if rollup else None,
+            head_sha=node["headRefOid"],
         )
-    )
 
 
-def get_current_branch():
-    """Get the name of the current Git branch."""
-    result = subprocess.run(
-        ["git", "rev-parse", "--abbrev-ref", "HEAD"], capture_output=True, text=True
+MY_PRS_QUERY = """
+query ($search: String!, $cursor: String) {
+  search(query: $search, type: ISSUE, first: 50, after: $cursor) {
+    pageInfo { hasNextPage endCursor }
+    nodes {
+      ... on PullRequest {
+        number
+        title
+        url
+        isDraft
+        reviewDecision
+        headRefOid
+        repository { name }
+        commits(last: 1) { nodes { commit { statusCheckRollup { state } } } }
+      }
+    }
+  }
+}
+"""
+
+
+@trace.traced("github")
+def get_my_prs():
+    """My open PRs with their review and CI state, from one paginated GraphQL query."""
+    variables = {
+        "search": f"is:open is:pr author:{GITHUB_USERNAME} archived:false user:{github_org()}",
+        "cursor": None,
+    }
+    prs = []
+    while True:
+        _, response = client().requester.graphql_query(MY_PRS_QUERY, variables)
+        search = response["data"]["search"]
+        prs.extend(PullRequest.from_graphql(node) for node in search["nodes"] if node)
+        if not search["pageInfo"]["hasNextPage"]:
+            return prs
+        variables["cursor"] = search["pageInfo"]["endCursor"]
+
+
+@trace.traced("github")
+def get_if_changed(path, etag=None):
+    """GET a REST resource unless it still has the given ETag.
+
+    Returns whether it changed, its current ETag and the response headers. A
+    304 Not Modified answer doesn't count against the rate limit.
+    """
+    headers = {"If-None-Match": etag} if etag else {}
+    status, response_headers, _ = client().requester.requestJson(
+        "GET", path, headers=headers
     )
-    result.check_returncode()
-    return result.stdout.strip()
+    if status == 304:
+        return False, etag, response_headers
+    if status >= 400:
+        raise RobotaError(f"GET {path} failed with {status}")
+    return True, response_headers.get("etag", etag), response_headers
+
+
+# Branches looked up per GraphQL query by get_pull_states
+PULL_STATES_BATCH = 50
+
+
+@trace.traced("github")
+def get_pull_states(heads):
+    """{(repo full name, branch): [states of the PRs from that branch]}
+
+    Every (repo full name, branch) pair becomes an aliased field of one GraphQL
+    query, so that the PRs of many workspaces take a single round trip.
+    States are OPEN, CLOSED or MERGED.
+    """
+    from github import GithubException
+
+    heads = sorted(set(heads))
+    states = {}
+    for start in range(0, len(heads), PULL_STATES_BATCH):
+        batch = heads[start : start + PULL_STATES_BATCH]
+        params, fields, variables = [], [], {}
+        for n, (full_name, branch) in enumerate(batch):
+            owner, name = full_name.split("/", 1)
+            variables.update({f"owner{n}": owner, f"name{n}": name, f"head{n}": branch})
+            params.append(f"$owner{n}: String!, $name{n}: String!, $head{n}: String!")
+            fields.append(
+                f"r{n}: repository(owner: $owner{n}, name: $name{n}) {{"
+                f" pullRequests(headRefName: $head{n}, first: 20) {{ nodes {{ state }} }} }}"
+            )
+        query = f"query ({', '.join(params)}) {{\n" + "\n".join(fields) + "\n}"
+        try:
+            _, response = client().requester.graphql_query(query, variables)
+        except GithubException as err:
+            # A missing repository is an error, but the other results are there
+            if not (isinstance(err.data, dict) and err.data.get("data")):
+                raise
+            response = err.data
+        for n, head in enumerate(batch):
+            repository = response["data"][f"r{n}"]
+            nodes = repository["pullRequests"]["nodes"] if repository else []
+            states[head] = [node["state"] for node in nodes]
+    return states
+
+
+def get_current_branch(cwd=None):
+    """Get the name of the current Git branch."""
+    return gitmeta.current_branch(cwd)
 
 
-def get_current_repo():
+def get_current_repo(cwd=None):
     """Get the URL of the current Git repository."""
-    result = subprocess.run(
-        ["git", "config", "--get", "remote.origin.url"], capture_output=True, text=True
-    )
-    result.check_returncode()
-    return result.stdout.strip()
-
-
-def get_default_branch(repo):
-    """Get the default (base) branch of a GitHub repository."""
-    repo = github.get_repo(repo)
-    return repo.default_branch
-
+    return gitmeta.remote_url(cwd)
 
-def create_pull(title, body, draft=False):
-    """Create a GitHub pull request."""
 
-    # Get current Git branch and repository
-    current_branch = get_current_branch()
-    repo_url = get_current_repo()
+def get_repo_name(cwd=None):
+    """Get the "owner/name" of the current repository on GitHub."""
+    return "/".join(gitmeta.parse_remote_url(get_current_repo(cwd)))
 
-    # Parse username and repo name from URL
-    username, repo_name = repo_url.split(":")[1].split("/")[0], repo_url.split("/")[
-        1
-    ].replace(".git", "")
 
-    # Get repository object
-    repo = github.get_repo(f"{username}/{repo_name}")
+@cache
+@trace.traced("github")
+def get_repo(full_name):
+    """Get a GitHub repository object, fetching each repository once per run."""
+    return client().get_repo(full_name)
 
-    # Get the default (base) branch for the repository
-    default_branch = get_default_branch(f"{username}/{repo_name}")
 
-    return repo.create_pull(title, body, default_branch, current_branch, draft=draft)
+@trace.traced("github")
+def create_pull(title, body, draft=False, branch=None, repo=None, cwd=None):
+    """Create a GitHub pull request.
 
+    The branch and repository default to those of the Git checkout in `cwd`.
+    """
+    branch = branch or get_current_branch(cwd)
+    repo = repo or get_repo(get_repo_name(cwd))
+    return repo.create_pull(
+        base=repo.default_branch, head=branch, title=title, body=body, draft=draft
+    )
 
-def commit_all_and_push(message):
-    """Commit all changes in the current directory and push"""
 
-    for command in [
-        ["git", "add", "."],
-        ["git", "commit", "-am", message],
-        ["git", "push", "-u", "origin", get_current_branch()],
-    ]:
+def run_git_commands(commands, cwd=None):
+    for command in commands:
         print("Running command", command)
-        result = subprocess.run(command, capture_output=True, text=True)
+        with trace.span("git", " ".join(command[:2])):
+            result = subprocess.run(command, capture_output=True, text=True, cwd=cwd)
         print(result.stdout.strip())
         if result.returncode != 0:
             cmd_string = " ".join(command)
@@ -89,9 +208,35 @@ def commit_all_and_push(message):
             )
 
 
-def is_current_directory_clean():
-    print(f"current directory: {os.getcwd()}")
-    script_path = os.path.join(os.path.dirname(__file__), 'is_clean.sh')
-    result = subprocess.run([script_path], capture_output=True, text=True)
-    print(f"is_clean returned {result.returncode}: {result.stdout}")
-    return result.returncode == 0
+def stage_all(cwd=None):
+    """Stage all changes in the current directory"""
+    run_git_commands([["git", "add", "."]], cwd)
+
+
+def commit_and_push(message, branch=None, cwd=None):
+    """Commit all staged and tracked changes and push them"""
+    run_git_commands(
+        [
+            ["git", "commit", "-am", message],
+            ["git", "push", "-u", "origin", branch or get_current_branch(cwd)],
+        ],
+        cwd,
+    )
+
+
+def push_and_open_pr(push_msg, title, body, draft=False, cwd=None):
+    """Commit all changes in a repository, push them and create a PR."""
+    branch = get_current_branch(cwd)
+    stage_all(cwd)
+    commit_and_push(push_msg, branch, cwd)
+    return create_pull(title, body, draft, branch=branch, cwd=cwd)
+
+
+@trace.traced("git")
+def has_changes(cwd=None):
+    """Whether a repository has any uncommitted or untracked changes."""
+    result = subprocess.run(
+        ["git", "status", "--porcelain"], capture_output=True, text=True, cwd=cwd
+    )
+    result.check_returncode()
+    return bool(result.stdout.strip())
@@ -0,0 +1,148 @@
+"""Git metadata read from the files under .git, without starting a git process.
+
+Handles regular checkouts, worktrees (whose .git is a `gitdir:` file) and bare
+repositories: HEAD, loose and packed refs, and the remotes in the config.
+Anything unusual, like a config with includes, falls back to running git.
+"""
+import os
+import re
+from urllib.parse import urlparse
+
+from . import trace
+from .errors import RobotaError
+
+# user@host:path, as understood by git when there is no scheme
+SCP_URL = re.compile(r"(?:[^@/]+@)?[^:/]+:(?!//)(.+)")
+CONFIG_SECTION = re.compile(r'\s*\[\s*([^\s\]"]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\]')
+
+
+def find_work_tree(cwd=None):
+    """The top directory of the repository containing `cwd`, or None."""
+    path = os.path.abspath(cwd or os.getcwd())
+    while True:
+        if os.path.exists(os.path.join(path, ".git")):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def git_dirs(path):
+    """The git dir and common dir of the repository at `path`, which differ for worktrees."""
+    git_dir = os.path.join(path, ".git")
+    if os.path.isfile(git_dir):
+        with open(git_dir) as f:
+            git_dir = os.path.join(path, f.read().strip().removeprefix("gitdir: "))
+    elif not os.path.exists(git_dir) and os.path.isfile(os.path.join(path, "HEAD")):
+        git_dir = path  # a bare repository
+    common_dir = git_dir
+    commondir_file = os.path.join(git_dir, "commondir")
+    if os.path.exists(commondir_file):
+        with open(commondir_file) as f:
+            common_dir = os.path.join(git_dir, f.read().strip())
+    return os.path.normpath(git_dir), os.path.normpath(common_dir)
+
+
+def _run_git(args, cwd=None):
+    from .checkout import run_git  # checkout uses this module
+
+    return run_git(args, cwd=cwd)
+
+
+def _dirs(cwd):
+    work_tree = find_work_tree(cwd)
+    if work_tree is None:
+        raise OSError(f"No git repository at {cwd or os.getcwd()}")
+    return git_dirs(work_tree)
+
+
+@trace.traced("git")
+def current_branch(cwd=None):
+    """The checked out branch, or "HEAD" if it is detached, like `git rev-parse --abbrev-ref HEAD`."""
+    try:
+        git_dir, _ = _dirs(cwd)
+        with open(os.path.join(git_dir, "HEAD")) as f:
+            head = f.read().strip()
+    except OSError:
+        return _run_git(["rev-parse", "--abbrev-ref", "HEAD"], cwd=cwd)
+    if head.startswith("ref: refs/heads/"):
+        return head.removeprefix("ref: refs/heads/")
+    return "HEAD"
+
+
+def ref_exists(path, ref):
+    """Whether a full ref name such as refs/remotes/origin/main exists in the repository at `path`."""
+    try:
+        _, common_dir = git_dirs(path)
+        if os.path.isfile(os.path.join(common_dir, ref)):
+            return True
+        packed_refs = os.path.join(common_dir, "packed-refs")
+        if not os.path.exists(packed_refs):
+            return False
+        with open(packed_refs) as f:
+            # Lines are "<sha> <ref>", plus comments and "^<sha>" for peeled tags
+            return any(line.rstrip("\n").partition(" ")[2] == ref for line in f)
+    except OSError:
+        pass
+    try:
+        _run_git(["rev-parse", "--verify", "--quiet", ref], cwd=path)
+    except RobotaError:
+        return False
+    return True
+
+
+@trace.traced("git")
+def remote_url(cwd=None, remote="origin"):
+    """The URL of a remote, like `git config --get remote.<remote>.url`."""
+    try:
+        _, common_dir = _dirs(cwd)
+        with open(os.path.join(common_dir, "config")) as f:
+            url = _config_value(f, "remote", remote, "url")
+    except (OSError, ValueError):
+        url = None
+    # git also understands the old [remote.origin] syntax, for one
+    return url or _run_git(["config", "--get", f"remote.{remote}.url"], cwd=cwd)
+
+
+def _config_value(lines, section, subsection, key):
+    """The last value of a key in a git config file.
+
+    Raises ValueError for what this simple reader doesn't handle: includes,
+    continued lines and quoted values.
+    """
+    value = None
+    current = None
+    for line in lines:
+        line = line.strip()
+        if not line or line[0] in "#;":
+            continue
+        match = CONFIG_SECTION.match(line)
+        if match:
+            current = (match[1].lower(), match[2])
+            if current[0] in ("include", "includeif"):
+                raise ValueError("config includes")
+            line = line[match.end() :].strip()
+            if not line:
+                continue
+        name, _, raw = line.partition("=")
+        if current == (section, subsection) and name.strip().lower() == key:
+            raw = raw.strip()
+            if raw.endswith("\\") or '"' in raw:
+                raise ValueError("unsupported config value")
+            value = re.split(r"\s+[#;]", raw, 1)[0]
+    return value
+
+
+def parse_remote_url(url):
+    """(owner, name) of a GitHub repository from any form of its remote URL.
+
+    Accepts git@github.com:owner/name.git, ssh://git@github.com/owner/name.git,
+    https://github.com/owner/name(.git) and the like.
+    """
+    match = None if "://" in url else SCP_URL.fullmatch(url)
+    path = match[1] if match else urlparse(url).path
+    parts = [part for part in path.split("/") if part]
+    if len(parts) < 2:
+        raise RobotaError(f"Not a GitHub repository URL: {url}")
+    return parts[-2], parts[-1].removesuffix(".git")
@@ -0,0 +1,139 @@
+"""Offline full-text index of the Jira issues that robota has fetched.
+
+The index lives in the store's database. Issue records are kept in a regular
+table, and an SQLite FTS5 table indexes their keys, summaries, statuses and
+assignees. Where SQLite was built without FTS5, searches fall back to LIKE.
+Only the MAX_ISSUES most recently changed issues are kept.
+"""
+import json
+import re
+import sqlite3
+import time
+from functools import cache
+
+from . import store
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS indexed_issues (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    summary TEXT NOT NULL,
+    status TEXT NOT NULL,
+    assignee TEXT NOT NULL,
+    record TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS indexed_issues_by_age ON indexed_issues (indexed_at);
+"""
+
+# An external-content FTS5 table over indexed_issues, kept in sync by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS issue_text USING fts5(
+    key, summary, status, assignee,
+    content = 'indexed_issues', content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+);
+CREATE TRIGGER IF NOT EXISTS indexed_issues_ai AFTER INSERT ON indexed_issues BEGIN
+    INSERT INTO issue_text (rowid, key, summary, status, assignee)
+    VALUES (new.id, new.key, new.summary, new.status, new.assignee);
+END;
+CREATE TRIGGER IF NOT EXISTS indexed_issues_ad AFTER DELETE ON indexed_issues BEGIN
+    INSERT INTO issue_text (issue_text, rowid, key, summary, status, assignee)
+    VALUES ('delete', old.id, old.key, old.summary, old.status, old.assignee);
+END;
+CREATE TRIGGER IF NOT EXISTS indexed_issues_au AFTER UPDATE ON indexed_issues BEGIN
+    INSERT INTO issue_text (issue_text, rowid, key, summary, status, assignee)
+    VALUES ('delete', old.id, old.key, old.summary, old.status, old.assignee);
+    INSERT INTO issue_text (rowid, key, summary, status, assignee)
+    VALUES (new.id, new.key, new.summary, new.status, new.assignee);
+END;
+"""
+
+# bm25 weights of the key, summary, status and assignee columns
+RANK = "bm25(issue_text, 10.0, 4.0, 1.0, 2.0)"
+DEFAULT_LIMIT = 20
+# The index keeps this many issues, dropping those that changed longest ago
+MAX_ISSUES = 20000
+
+
+@cache
+def _has_fts():
+    """Create the index tables, returning whether full-text search is available."""
+    conn = store.connection()
+    conn.executescript(SCHEMA)
+    try:
+        conn.executescript(FTS_SCHEMA)
+    except sqlite3.OperationalError:  # no such module: fts5
+        return False
+    return True
+
+
+def update(issues):
+    """Add or refresh `jira.Issue` records in the index."""
+    issues = list(issues)
+    if not issues:
+        return
+    _has_fts()
+    now = time.time()
+    with store.transaction():
+        store.connection().executemany(
+            "INSERT INTO indexed_issues"
+            " (key, summary, status, assignee, record, indexed_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET"
+            " summary = excluded.summary, status = excluded.status,"
+            " assignee = excluded.assignee, record = excluded.record,"
+            " indexed_at = excluded.indexed_at"
+            " WHERE record != excluded.record",
+            [
+                (
+                    issue.key,
+                    issue.summary,
+                    issue.status,
+                    issue.assignee or "",
+                    json.dumps(issue),
+                    now,
+                )
+                for issue in issues
+            ],
+        )
+        store.connection().execute(
+            "DELETE FROM indexed_issues WHERE id IN (SELECT id FROM indexed_issues"
+            " ORDER BY indexed_at DESC LIMIT -1 OFFSET ?)",
+            (MAX_ISSUES,),
+        )
+
+
+def find(text, limit=DEFAULT_LIMIT):
+    """The indexed issues that best match `text`, as `jira.Issue` records.
+
+    Every word must match the start of a word in the key, summary, status or
+    assignee; an exact key comes first, then matches in keys and summaries.
+    """
+    from .jira import Issue
+
+    words = re.findall(r"\w+", text)
+    if not words:
+        return []
+    conn = store.connection()
+    if _has_fts():
+        # Whole words also match as themselves, so that they outrank prefixes
+        query = " AND ".join(f'("{word}" OR "{word}"*)' for word in words)
+        rows = conn.execute(
+            "SELECT record FROM indexed_issues JOIN issue_text"
+            " ON issue_text.rowid = indexed_issues.id"
+            f" WHERE issue_text MATCH ? ORDER BY indexed_issues.key = ? DESC, {RANK}"
+            " LIMIT ?",
+            (query, text.strip().upper(), limit),
+        )
+    else:
+        conditions = " AND ".join(
+            ["(key || ' ' || summary || ' ' || status || ' ' || assignee) LIKE ?"]
+            * len(words)
+        )
+        rows = conn.execute(
+            f"SELECT record FROM indexed_issues WHERE {conditions}"
+            " ORDER BY indexed_at DESC LIMIT ?",
+            (*(f"%{word}%" for word in words), limit),
+        )
+    return [Issue(*json.loads(record)) for (record,) in rows]
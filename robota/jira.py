@@ -1,57 +1,518 @@
-from jira import JIRA
+import math
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
 
-from .env import JIRA_API_TOKEN, JIRA_EMAIL, JIRA_HOST
+from . import issue_index, store, trace
+from .env import (
+    HTTP_TIMEOUT,
+    ISSUE_MEMO_TTL,
+    JIRA_API_TOKEN,
+    JIRA_EMAIL,
+    JIRA_HOST,
+    JIRA_METADATA_TTL,
+    SPRINT_LIST_TTL,
+)
+from .errors import RobotaError
+from .lazy import once
 
-jira = JIRA(server=JIRA_HOST, basic_auth=(JIRA_EMAIL, JIRA_API_TOKEN))
+MY_ISSUES_JQL = "assignee = currentUser() AND resolution = Unresolved"
+# Store namespaces for the issue cache (of `Issue` records) and its sync state
+MY_ISSUES = "my-issue-records"
+SYNC = "jira-sync"
 
+# Store namespace for metadata that rarely changes: fields, transitions,
+# projects, boards and sprints
+METADATA = "jira-metadata"
+store.limit(METADATA, 1000)
 
+# Custom fields are looked up by name; these IDs are used if none matches
+STORY_POINTS_NAMES = ["story points", "story point estimate"]
+SPRINT_NAMES = ["sprint"]
+DEFAULT_STORY_POINTS = "customfield_10016"
+DEFAULT_SPRINTS = "customfield_10020"
+# The fields that `Issue` and the issue cache need, besides the custom ones;
+# everything else in an issue (description, comments, ...) is never downloaded.
+ISSUE_FIELDS = ["summary", "status", "assignee", "project", "resolution", "issuetype"]
+PAGE_SIZE = 100
+
+# Issues fetched by get_issues during this process: {key: (monotonic time, Issue)}
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+class Issue(NamedTuple):
+    """The parts of a Jira issue that robota uses, extracted once per fetch."""
+
+    key: str
+    number: int  # the numeric part of the key, for sorting
+    status: str
+    assignee: str | None  # display name
+    summary: str
+    estimate: float | None  # story points
+    sprint: str  # name of the active sprint, if any
+    sprint_ids: tuple  # ids of all sprints the issue is or was in
+    project: str
+    url: str
+    resolution: str | None = None  # records cached before this field read as None
+    issue_type: str | None = None  # "Story", "Bug"... which selects the workflow
+
+    @classmethod
+    def from_raw(cls, raw):
+        fields = raw["fields"]
+        story_points_field, sprints_field = custom_fields()
+        sprints = fields.get(sprints_field) or []
+        return cls(
+            key=raw["key"],
+            number=int(raw["key"].rsplit("-", 1)[1]),
+            status=fields["status"]["name"],
+            assignee=(fields.get("assignee") or {}).get("displayName"),
+            summary=fields["summary"],
+            estimate=fields.get(story_points_field),
+            sprint=next((s["name"] for s in sprints if s["state"] == "active"), ""),
+            sprint_ids=tuple(s["id"] for s in sprints),
+            project=fields["project"]["key"],
+            url=f"{JIRA_HOST.rstrip('/')}/browse/{raw['key']}",
+            resolution=(fields.get("resolution") or {}).get("name"),
+            issue_type=(fields.get("issuetype") or {}).get("name"),
+        )
+
+
+@once
+def client():
+    """Connect to Jira on first use, so that local commands never pay for it."""
+    with trace.span("auth", "jira client"):
+        from jira import JIRA
+
+        from . import transport
+
+        # Retries are left to the shared transport, which is mounted before the
+        # first request; the server info is what JIRA() would have fetched itself.
+        jira = JIRA(
+            server=JIRA_HOST,
+            basic_auth=(JIRA_EMAIL, JIRA_API_TOKEN),
+            get_server_info=False,
+            max_retries=0,
+            timeout=HTTP_TIMEOUT,
+        )
+        transport.mount(jira._session)
+        _seed_fields_cache(jira, store.get(METADATA, "fields"))
+        server_info = jira.server_info()
+        jira._version = tuple(server_info["versionNumbers"])
+        jira.deploymentType = server_info.get("deploymentType")
+    return jira
+
+
+def _metadata(key, fetch, ttl=JIRA_METADATA_TTL):
+    """A metadata value from the store, fetched again after `ttl` seconds."""
+    value = store.get(METADATA, key)
+    if value is None:
+        value = fetch()
+        store.set(METADATA, key, value, ttl=ttl)
+    return value
+
+
+def _seed_fields_cache(jira, fields):
+    """Give the client our copy of the field list, which it would fetch itself."""
+    if fields:
+        jira._fields_cache_value = {
+            name: field["id"] for field in fields for name in field["clauseNames"]
+        }
+
+
+def _fields():
+    def fetch():
+        fields = [
+            {
+                "id": field["id"],
+                "name": field["name"],
+                "clauseNames": field.get("clauseNames", []),
+            }
+            for field in client().fields()
+        ]
+        _seed_fields_cache(client(), fields)
+        return fields
+
+    return _metadata("fields", fetch)
+
+
+@once
+def custom_fields():
+    """The IDs of the story points and sprint fields, found by name."""
+    by_name = {field["name"].lower(): field["id"] for field in _fields()}
+    return tuple(
+        next((by_name[name] for name in names if name in by_name), default)
+        for names, default in [
+            (STORY_POINTS_NAMES, DEFAULT_STORY_POINTS),
+            (SPRINT_NAMES, DEFAULT_SPRINTS),
+        ]
+    )
+
+
+def issue_fields():
+    return [*ISSUE_FIELDS, *custom_fields()]
+
+
+def search(jql, fields=None):
+    """Yield the raw JSON of the issues matching `jql`, one page at a time.
+
+    Unlike `search_issues` with its default cap, this never truncates the
+    results, and the caller can start using the first page right away. The
+    JSON is not wrapped in `jira` Resource objects, which are slow to build.
+    """
+    start = 0
+    while True:
+        with trace.span("jira", "search", jql=jql, start=start):
+            page = client().search_issues(
+                jql,
+                startAt=start,
+                maxResults=PAGE_SIZE,
+                fields=fields or issue_fields(),
+                json_result=True,
+            )
+        issues = page["issues"]
+        yield from issues
+        start += len(issues)
+        if not issues or start >= page["total"]:
+            return
+
+
+@trace.traced("jira")
 def get_my_issues():
-    return jira.search_issues(
-        "assignee = currentUser() AND resolution = Unresolved ORDER BY priority DESC, updated DESC"
+    """Issues assigned to me, served from the local issue cache after a delta sync.
+
+    The first call downloads everything. After that, a single query fetches
+    only the issues updated since the last sync, including cached issues that
+    have since been resolved or reassigned, which are then dropped.
+    """
+    sync = store.get(SYNC, MY_ISSUES)
+    if sync is None:
+        _full_sync()
+    else:
+        try:
+            _delta_sync(sync)
+        except Exception as err:
+            if getattr(err, "status_code", None) != 400:
+                raise
+            _full_sync()  # e.g. a cached issue was deleted or moved
+    return [Issue(*record) for record in store.items(MY_ISSUES).values()]
+
+
+def _full_sync():
+    synced_at = time.time()
+    issues = search(f"{MY_ISSUES_JQL} ORDER BY priority DESC, updated DESC")
+    issues = [Issue.from_raw(raw) for raw in issues]
+    me = client().myself()
+    with store.transaction():
+        store.clear(MY_ISSUES)
+        for issue in issues:
+            store.set(MY_ISSUES, issue.key, issue)
+        store.set(SYNC, MY_ISSUES, {"synced_at": synced_at, "me": me})
+    issue_index.update(issues)
+
+
+def _delta_sync(sync):
+    synced_at = time.time()
+    # A relative date avoids any timezone mismatch between us and the server;
+    # the extra minute covers the request that was in flight during the last sync.
+    minutes = math.ceil((synced_at - sync["synced_at"]) / 60) + 1
+    jql = MY_ISSUES_JQL
+    cached_keys = store.keys(MY_ISSUES)
+    if cached_keys:
+        jql = f"({jql} OR key in ({', '.join(cached_keys)}))"
+    changed = list(search(f'{jql} AND updated >= "-{minutes}m"'))
+    with store.transaction():
+        for raw in changed:
+            if _is_mine(raw, sync["me"]):
+                store.set(MY_ISSUES, raw["key"], Issue.from_raw(raw))
+            else:
+                store.delete(MY_ISSUES, raw["key"])
+        store.set(SYNC, MY_ISSUES, {**sync, "synced_at": synced_at})
+    # Issues that are no longer mine stay in the index, with their new status
+    issue_index.update(map(Issue.from_raw, changed))
+
+
+def _is_mine(raw, me):
+    fields = raw["fields"]
+    assignee = fields.get("assignee") or {}
+    return fields.get("resolution") is None and any(
+        me.get(attr) and assignee.get(attr) == me.get(attr)
+        for attr in ("accountId", "key", "name")
     )
 
 
+@trace.traced("jira")
 def get_issue(key):
-    return jira.issue(key)
+    issue = get_issues([key]).get(key.upper())
+    if issue is None:
+        raise RobotaError(f"There is no Jira issue {key}")
+    return issue
 
 
+@trace.traced("jira")
+def get_issues(keys):
+    """{key: Issue} for several issues, fetched with a single query.
+
+    Issues fetched in the last ISSUE_MEMO_TTL seconds are reused, so looking up
+    the same story again during a command (or in the daemon) is free. Jira
+    rejects the whole query if any of the keys doesn't exist, so then the
+    issues are fetched one by one, leaving out the missing ones.
+    """
+    keys = {key.upper() for key in keys}
+    now = time.monotonic()
+    with _memo_lock:
+        found = {
+            key: _memo[key][1]
+            for key in keys
+            if key in _memo and now - _memo[key][0] < ISSUE_MEMO_TTL
+        }
+    missing = sorted(keys - found.keys())
+    if not missing:
+        return found
+    try:
+        # A single key is fetched directly, so a missing one comes back as a 404
+        # rather than a failed search that has to be retried. Both still need
+        # the field list, which costs a GET /field while the metadata is cold.
+        if len(missing) == 1:
+            issues = [issue for issue in [_get_existing_issue(missing[0])] if issue]
+        else:
+            issues = [
+                Issue.from_raw(raw) for raw in search(f"key in ({', '.join(missing)})")
+            ]
+    except Exception as err:
+        if getattr(err, "status_code", None) != 400:
+            raise
+        with ThreadPoolExecutor() as pool:
+            issues = [
+                issue for issue in pool.map(_get_existing_issue, missing) if issue
+            ]
+    issue_index.update(issues)
+    with _memo_lock:
+        for issue in issues:
+            _memo[issue.key] = (now, issue)
+    return {**found, **{issue.key: issue for issue in issues}}
+
+
+def _forget(key):
+    """Drop an issue that we just changed from the memo."""
+    with _memo_lock:
+        _memo.pop(str(key).upper(), None)
+
+
+def _get_existing_issue(key):
+    try:
+        return Issue.from_raw(client().issue(key, fields=",".join(issue_fields())).raw)
+    except Exception as err:
+        if getattr(err, "status_code", None) != 404:
+            raise
+        return None
+
+
+@trace.traced("jira")
 def add_comment_to_issue(issue, comment_text):
-    return jira.add_comment(issue, comment_text)
+    _forget(issue)
+    return client().add_comment(issue, comment_text)
 
 
+@trace.traced("jira")
 def set_issue_status(issue, status):
-    return jira.transition_issue(issue, status)
+    """Move an issue to a status, named by the transition or by the status itself.
+
+    Transitions are cached per project and issue type, which together select
+    the workflow, with the status each one leads to, so that usually only the
+    transition is sent. If Jira rejects a cached transition, as after a
+    workflow change or from an unexpected status, the issue's transitions are
+    fetched again. `issue` is a key, or an `Issue` that the caller already has.
+    """
+    if not isinstance(issue, Issue):
+        issue = get_issue(issue)
+    _forget(issue.key)
+    key = None
+    cached = []
+    if issue.issue_type:
+        key = f"transitions:{issue.project}:{issue.issue_type}"
+        cached = store.get(METADATA, key) or []
+    transition = _find_transition(cached, status)
+    if transition:
+        try:
+            return client().transition_issue(issue.key, transition["id"])
+        except Exception as err:
+            if getattr(err, "status_code", None) != 400:
+                raise
+    available = [
+        {"id": t["id"], "name": t["name"], "to": t.get("to", {}).get("name")}
+        for t in client().transitions(issue.key)
+    ]
+    if key:
+        fresh = {t["id"] for t in available}
+        # A cached transition that was just rejected is dropped as well
+        known = [t for t in cached if t["id"] not in fresh and t is not transition]
+        store.set(METADATA, key, known + available, ttl=JIRA_METADATA_TTL)
+    found = _find_transition(available, status)
+    if not found:
+        raise RobotaError(
+            f"{issue.key} cannot be moved to {status} from its current status"
+        )
+    return client().transition_issue(issue.key, found["id"])
+
 
+def _find_transition(transitions, status):
+    """The transition leading to the status `status`, else the one named so."""
+    for field in ("to", "name"):
+        for transition in transitions:
+            if (transition[field] or "").lower() == status.lower():
+                return transition
+    return None
 
+
+@trace.traced("jira")
 def get_projects():
-    return sorted(
-        [(project.name, project.key) for project in jira.projects()], key=lambda x: x[0]
-    )
+    return [
+        tuple(project)
+        for project in _metadata(
+            "projects",
+            lambda: sorted(
+                [(project.name, project.key) for project in client().projects()],
+                key=lambda x: x[0],
+            ),
+        )
+    ]
 
 
+@trace.traced("jira")
 def get_boards():
-    return sorted(
-        [(board.name, board.id) for board in jira.boards()], key=lambda x: x[0]
-    )
+    """(name, id, type) of every board; the type is "scrum", "kanban" or "simple"."""
+    return [
+        tuple(board)
+        for board in _metadata(
+            # Renamed when the board type was added to the cached records
+            "boards:typed",
+            lambda: sorted(
+                [
+                    (board.name, board.id, getattr(board, "type", "scrum"))
+                    for board in client().boards()
+                ],
+                key=lambda x: x[0],
+            ),
+        )
+    ]
 
 
-def get_sprints(board_id):
+@trace.traced("jira")
+def get_sprints(board_id, state="active,future"):
     return [
-        (sprint.name, sprint.state, sprint.id)
-        for sprint in jira.sprints(board_id, state="active,future")
+        tuple(sprint)
+        for sprint in _metadata(
+            f"sprints:{board_id}:{state}",
+            lambda: [
+                (sprint.name, sprint.state, sprint.id)
+                for sprint in client().sprints(board_id, state=state)
+            ],
+            ttl=SPRINT_LIST_TTL,
+        )
     ]
 
 
+def _sprint_names(board_ids, state="active,future"):
+    """{sprint id: name} of the sprints of several boards, listed concurrently."""
+    with ThreadPoolExecutor() as pool:
+        boards = pool.map(lambda board_id: _board_sprints(board_id, state), board_ids)
+        return {
+            sprint_id: sprint_name
+            for sprints in boards
+            for sprint_name, _, sprint_id in sprints
+        }
+
+
+def _board_sprints(board_id, state):
+    """The sprints of a board, or none for Kanban and simple boards."""
+    try:
+        return get_sprints(board_id, state)
+    except Exception as err:
+        if getattr(err, "status_code", None) != 400:
+            raise
+        return []  # Jira: "The board does not support sprints"
+
+
+def _sprint_jql(sprint_ids):
+    return f"sprint in ({', '.join(str(sprint_id) for sprint_id in sprint_ids)})"
+
+
 def get_sprint_issues(sprint_id):
-    return jira.search_issues(
-        f"sprint = {sprint_id} AND resolution = Unresolved ORDER BY status DESC, updated DESC"
+    return _indexed(
+        map(
+            Issue.from_raw,
+            search(
+                f"sprint = {sprint_id} AND resolution = Unresolved ORDER BY key DESC"
+            ),
+        )
     )
 
 
-def get_unestimated_issues_by_sprint(board_id):
-    result = {}
-    for sprint_name, _, sprint_id in get_sprints(board_id):
-        for issue in get_sprint_issues(sprint_id):
-            if issue.fields.customfield_10016 is None:
-                result.setdefault(sprint_name, []).append(issue)
-    return result
+def _indexed(issues):
+    """Pass streamed issues through, adding them to the search index in batches."""
+    batch = []
+    for issue in issues:
+        yield issue
+        batch.append(issue)
+        if len(batch) == PAGE_SIZE:
+            issue_index.update(batch)
+            batch = []
+    issue_index.update(batch)
+
+
+@trace.traced("jira")
+def get_unestimated_issues_by_sprint(*board_ids):
+    """Unresolved issues without story points in the open sprints of the boards.
+
+    The sprints of all boards are listed concurrently, and then a single query
+    fetches the unestimated issues of all of them, which are grouped by sprint
+    name here. An issue that was carried over shows up under each open sprint.
+    """
+    sprint_names = _sprint_names(board_ids)
+    if not sprint_names:
+        return {}
+    story_points_id = custom_fields()[0].removeprefix("customfield_")
+
+    by_sprint = defaultdict(list)
+    for raw in search(
+        f"{_sprint_jql(sprint_names)}"
+        f" AND resolution = Unresolved AND cf[{story_points_id}] is EMPTY"
+        " ORDER BY status DESC, updated DESC"
+    ):
+        issue = Issue.from_raw(raw)
+        for sprint_id in issue.sprint_ids:
+            if sprint_id in sprint_names:
+                by_sprint[sprint_id].append(issue)
+
+    return {
+        sprint_names[sprint_id]: by_sprint[sprint_id]
+        for sprint_id in sprint_names
+        if by_sprint[sprint_id]
+    }
+
+
+@trace.traced("jira")
+def get_active_sprint_issues(*board_ids):
+    """All issues in the active sprints of the boards (of every Scrum board if none).
+
+    The active sprints are listed concurrently, and then a single query fetches
+    the issues of all of them. Returns the sprint names and the issues.
+    """
+    if not board_ids:
+        board_ids = [
+            board_id
+            for _, board_id, board_type in get_boards()
+            if board_type == "scrum"
+        ]
+    sprint_names = _sprint_names(board_ids, state="active")
+    if not sprint_names:
+        return [], []
+    issues = [
+        Issue.from_raw(raw)
+        for raw in search(f"{_sprint_jql(sprint_names)} ORDER BY key ASC")
+    ]
+    issue_index.update(issues)
+    return sorted(set(sprint_names.values())), issues
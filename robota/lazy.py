@@ -0,0 +1,22 @@
+import threading
+from functools import wraps
+
+
+def once(factory):
+    """Call a zero-argument factory on first use only, even from several threads.
+
+    Used for the API clients, which are expensive to build and are shared by
+    commands that fan requests out over a thread pool.
+    """
+    lock = threading.Lock()
+    instances = []
+
+    @wraps(factory)
+    def wrapper():
+        if not instances:
+            with lock:
+                if not instances:
+                    instances.append(factory())
+        return instances[0]
+
+    return wrapper
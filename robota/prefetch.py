@@ -0,0 +1,85 @@
+"""Snapshots of slow listings, refreshed in the background while the REPL is idle."""
+import threading
+import time
+from collections import defaultdict
+
+from .env import PREFETCH_INTERVAL
+
+# Snapshots older than this are fetched again instead of being shown
+MAX_AGE = 2 * PREFETCH_INTERVAL
+
+_snapshots = {}  # name -> (fetched_at, value)
+# Set while a Prefetcher runs. Other processes, such as one-off commands or the
+# daemon, always fetch, because nothing keeps their snapshots fresh.
+_prefetching = threading.Event()
+# Held while a listing is being fetched, so that a command asking for it waits
+# for the background fetch in flight instead of starting another one.
+_fetch_locks = defaultdict(threading.Lock)
+
+
+def latest(name, fetch, refresh=False):
+    """Return `(value, age_in_seconds)` for a listing, fetching it if needed.
+
+    Snapshots are only reused while a Prefetcher keeps them fresh.
+    """
+    with _fetch_locks[name]:
+        snapshot = _snapshots.get(name)
+        if (
+            refresh
+            or not _prefetching.is_set()
+            or snapshot is None
+            or time.time() - snapshot[0] > MAX_AGE
+        ):
+            value = fetch()
+            snapshot = _snapshots[name] = (time.time(), value)
+    fetched_at, value = snapshot
+    return value, time.time() - fetched_at
+
+
+def describe_age(age):
+    if age < 60:
+        return f"{int(age)}s"
+    return f"{int(age // 60)}m {int(age % 60)}s"
+
+
+class Prefetcher(threading.Thread):
+    """Refreshes snapshots every PREFETCH_INTERVAL seconds, but only while idle.
+
+    A refresh that is already running when a command starts is allowed to
+    finish; the command then picks up its result.
+    """
+
+    def __init__(self, fetchers):
+        super().__init__(name="robota-prefetch", daemon=True)
+        self.fetchers = fetchers
+        self._idle = threading.Event()
+        self._stopped = threading.Event()
+
+    def idle(self):
+        self._idle.set()
+
+    def busy(self):
+        self._idle.clear()
+
+    def stop(self):
+        self._stopped.set()
+        self._idle.set()
+
+    def run(self):
+        _prefetching.set()
+        try:
+            self._refresh_while_idle()
+        finally:
+            _prefetching.clear()
+
+    def _refresh_while_idle(self):
+        while not self._stopped.is_set():
+            self._idle.wait()
+            for name, fetch in self.fetchers.items():
+                if not self._idle.is_set() or self._stopped.is_set():
+                    break
+                try:
+                    latest(name, fetch, refresh=True)
+                except Exception:
+                    pass  # the next command fetches it in the foreground instead
+            self._stopped.wait(PREFETCH_INTERVAL)
@@ -1,6 +1,13 @@
 import functools
 
-from rich.progress import Progress, SpinnerColumn, TimeElapsedColumn
+from rich.progress import (
+    BarColumn,
+    MofNCompleteColumn,
+    Progress,
+    SpinnerColumn,
+    TextColumn,
+    TimeElapsedColumn,
+)
 
 
 def with_progress(fn):
@@ -18,3 +25,14 @@ def with_progress(fn):
                 progress.update(task, advance=100)
 
     return wrapper
+
+
+def step_progress():
+    """A progress display with one live row per task, for concurrent work."""
+    return Progress(
+        SpinnerColumn(),
+        TextColumn("{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TimeElapsedColumn(),
+    )
@@ -3,9 +3,12 @@ from collections import defaultdict
 from rich.console import Console
 
 from .errors import RobotaError
+from .github import get_my_prs
+from .jira import get_my_issues
+from .prefetch import Prefetcher
 
 from .repl_github import evaluate_org, evaluate_prs, evaluate_workon
-from .repl_jira import evaluate_list
+from .repl_jira import evaluate_find, evaluate_list, evaluate_sprint
 
 console = Console()
 
@@ -64,17 +67,24 @@ evaluators = {
     "w": evaluate_workon,
     "o": evaluate_org,
     "p": evaluate_prs,
+    "s": evaluate_sprint,
+    "f": evaluate_find,
     "q": evaluate_quit,
     "h": evaluate_help,
 }
 
 
 def loop():
+    # Keep my issues (including the active sprint) and PRs fresh while idle
+    prefetcher = Prefetcher({"issues": get_my_issues, "prs": get_my_prs})
+    prefetcher.start()
     while True:
+        prefetcher.idle()
         try:
             s = console.input(f"[green]robota ({'/'.join(evaluators.keys())}) > ")
         except EOFError:
             break
+        prefetcher.busy()
         if not s:
             continue
         try:
@@ -91,6 +101,7 @@ def loop():
         except Exception as e:
             console.print_exception(show_locals=True)
             break
+    prefetcher.stop()
 
 
 if __name__ == "__main__":
@@ -1,15 +1,43 @@
 import json
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from rich.prompt import Prompt
 from rich.table import Table
 from slugify import slugify
 
-from .env import CHECKOUT_DIR, GITHUB_REPOS, IDE_COMMAND, USER_NICKNAME
+from . import trace
+from .checkout import checkout_repo, checkout_steps
+from .cleanup import empty_trash, gc_plan, trash
+from .env import (
+    CHECKOUT_DIR,
+    CHECKOUT_WORKERS,
+    GITHUB_REPOS,
+    IDE_COMMAND,
+    TERMINAL_COMMAND,
+    USER_NICKNAME,
+)
+from .errors import RobotaError
 from .github import get_my_prs, github_org
 from .jira import get_issue
-from .progress import with_progress
+from .prefetch import describe_age, latest
+from .progress import step_progress, with_progress
+from .status import scan
+
+
+review_labels = {
+    "APPROVED": "[green]approved",
+    "CHANGES_REQUESTED": "[red]changes requested",
+    "REVIEW_REQUIRED": "[yellow]review required",
+}
+check_labels = {
+    "SUCCESS": "[green]passing",
+    "FAILURE": "[red]failing",
+    "ERROR": "[red]error",
+    "PENDING": "[yellow]pending",
+    "EXPECTED": "[yellow]expected",
+}
 
 
 def ask_user_for_repos():
@@ -25,12 +53,8 @@ def ask_user_for_repos():
     return repos
 
 
-@with_progress
-def checkout_repos(workdir_path, title, repos):
-    return _checkout_repos(workdir_path, title, repos)
-
-
 def _checkout_repos(workdir_path, title, repos):
+    """Check out all repos concurrently, returning {repo: error} for the failed ones."""
     if not repos:
         repos = ask_user_for_repos()
 
@@ -38,24 +62,41 @@ def _checkout_repos(workdir_path, title, repos):
 
     branchname = f"{USER_NICKNAME}-{jira_story_id}-{slugify(title)}"
 
-    for repo in [r for r in repos if r.strip()]:
-        print(f"Checking out {github_org()}/{repo}")
-        cmd = (
-            f"cd {workdir_path} && "
-            f"git clone git@github.com:{github_org()}/{repo}.git && "
-            f"cd {repo} && "
-            f"git fetch && "
-            f'git checkout -B {branchname} $(git rev-parse --verify {branchname} || echo "")'
-        )
-        print("Running", cmd)
-        result = subprocess.run(
-            cmd, shell=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE
-        )
-        if result.returncode != 0:
-            raise Exception("Failed to clone repo or checkout branch")
+    org = github_org()
+    steps = checkout_steps()
+    failures = {}
+    with step_progress() as progress, ThreadPoolExecutor(CHECKOUT_WORKERS) as pool:
+        futures = {}
+        for repo in [r for r in repos if r.strip()]:
+            task = progress.add_task(f"{org}/{repo}", total=len(steps))
 
+            def on_step(step, task=task, repo=repo):
+                if step != steps[0]:
+                    progress.advance(task)
+                progress.update(task, description=f"{org}/{repo}: {step}")
 
-@with_progress
+            future = pool.submit(
+                checkout_repo, workdir_path, org, repo, branchname, on_step
+            )
+            futures[future] = (repo, task)
+
+        for future in as_completed(futures):
+            repo, task = futures[future]
+            try:
+                future.result()
+            except Exception as err:  # keep checking out the other repos
+                failures[repo] = str(err)
+                progress.update(task, description=f"[red]{org}/{repo}: failed")
+            else:
+                progress.update(
+                    task,
+                    description=f"[green]{org}/{repo}: {branchname}",
+                    completed=len(steps),
+                )
+    return failures
+
+
+@trace.traced("command")
 def evaluate_workon(console, ast):
     """
     Work on a JIRA story: check out the branches and set up the workspace.
@@ -70,24 +111,23 @@ def evaluate_workon(console, ast):
     workdir_path = os.path.join(CHECKOUT_DIR, proj_slug)
 
     # Fetch the story
-    jira_story = get_issue(jira_story_id)
+    jira_story = with_progress(get_issue)(jira_story_id)
 
-    workspace_fname = f"{workdir_path}/{proj_slug}-{slugify(jira_story.fields.summary)}.code-workspace"
+    workspace_fname = (
+        f"{workdir_path}/{proj_slug}-{slugify(jira_story.summary)}.code-workspace"
+    )
     if not os.path.exists(workdir_path):
+        checkout_steps()  # fails for a bad CHECKOUT_MODE before anything is created
         os.makedirs(workdir_path)
-        _checkout_repos(workdir_path, jira_story.fields.summary, ast[2:])
-        repo_dirs = os.listdir(workdir_path)
-        with open(workspace_fname, "w") as f:
-            json.dump(
-                {
-                    "folders": [{"path": subfolder} for subfolder in repo_dirs],
-                    "settings": {
-                        "workbench.colorTheme": "Tokyo Night",
-                        "typescript.tsdk": "node_modules/typescript/lib",
-                    },
-                },
-                f,
+        try:
+            _set_up_workspace(
+                console, workdir_path, workspace_fname, jira_story, ast[2:]
             )
+        except BaseException:
+            # The next `w` would skip the checkout of a half-made workspace
+            trash(workdir_path)
+            empty_trash()
+            raise
 
     first_repo = os.path.join(
         workdir_path,
@@ -95,12 +135,40 @@ def evaluate_workon(console, ast):
     )  # To be used later for terminal
     command = f"{IDE_COMMAND or 'code'} {workspace_fname}"
     console.print(f"Running {command}...")
-    subprocess.run(command, shell=True)
+    with trace.span("ide", "open workspace"):
+        subprocess.run(command, shell=True)
     script_path = os.path.join(os.path.dirname(__file__), "open_terminal_at.sh")
-    result = subprocess.run([script_path, first_repo], capture_output=True, text=True)
+    with trace.span("ide", "open terminal"):
+        result = subprocess.run(
+            [TERMINAL_COMMAND or script_path, first_repo],
+            capture_output=True,
+            text=True,
+        )
     result.check_returncode()
 
 
+def _set_up_workspace(console, workdir_path, workspace_fname, jira_story, repos):
+    """Check out the repos into a new workspace and write its VS Code workspace file."""
+    failures = _checkout_repos(workdir_path, jira_story.summary, repos)
+    for repo, error in failures.items():
+        console.print(f"[red]Could not check out {repo}: {error}")
+    repo_dirs = os.listdir(workdir_path)
+    if not repo_dirs:
+        raise RobotaError(f"No repositories checked out for {jira_story.key}")
+    with open(workspace_fname, "w") as f:
+        json.dump(
+            {
+                "folders": [{"path": subfolder} for subfolder in repo_dirs],
+                "settings": {
+                    "workbench.colorTheme": "Tokyo Night",
+                    "typescript.tsdk": "node_modules/typescript/lib",
+                },
+            },
+            f,
+        )
+
+
+@trace.traced("command")
 def evaluate_org(console, ast):
     """Get or Set the GitHub organization
 
@@ -114,15 +182,94 @@ def evaluate_org(console, ast):
 
 
 @with_progress
+@trace.traced("command")
 def evaluate_prs(console, ast):
-    """List my pull requests"""
-    prs = get_my_prs()
+    """List my pull requests (`p -f` to refresh now)"""
+    prs, age = latest("prs", get_my_prs, refresh="-f" in ast)
     table = Table(title=f"My Pull Requests from {github_org()}")
     table.add_column("PR")
     table.add_column("Summary")
+    table.add_column("Review")
+    table.add_column("Checks")
     for pr in prs:
         table.add_row(
-            f"[link={pr.html_url}]{pr.repository.name}/{pr.number}",
-            f"[link={pr.html_url}]{pr.title}",
+            f"[link={pr.html_url}]{pr.repository}/{pr.number}",
+            f"[link={pr.html_url}]{'[dim]Draft: [/dim]' if pr.draft else ''}{pr.title}",
+            review_labels.get(pr.review_decision, ""),
+            check_labels.get(pr.checks, pr.checks or ""),
         )
+    with trace.span("render", "prs table"):
+        console.print(table)
+    if age >= 1:
+        console.print(f"[dim]As of {describe_age(age)} ago")
+
+
+@with_progress
+@trace.traced("command")
+def evaluate_status(console, ast):
+    """Show uncommitted changes and unpushed commits in all story workspaces"""
+    table = Table(title="Workspaces")
+    table.add_column("Workspace")
+    table.add_column("Repo")
+    table.add_column("Branch")
+    table.add_column("Upstream")
+    table.add_column("Changes")
+    for workspace, repos in scan(use_cache="-f" not in ast).items():
+        for repo in repos:
+            if repo.error:
+                changes = f"[red]{repo.error}"
+            elif repo.changed or repo.untracked:
+                counts = [(repo.changed, "changed"), (repo.untracked, "untracked")]
+                changes = "[yellow]" + ", ".join(
+                    f"{n} {what}" for n, what in counts if n
+                )
+            else:
+                changes = "[green]clean"
+            if repo.upstream:
+                upstream = f"{repo.upstream} +{repo.ahead} -{repo.behind}"
+            else:
+                upstream = "[dim]none"
+                if repo.ahead:
+                    upstream = f"[yellow]{repo.ahead} unpushed"
+            table.add_row(
+                os.path.basename(workspace),
+                os.path.basename(repo.path),
+                repo.branch or "[dim](detached)",
+                upstream,
+                changes,
+            )
     console.print(table)
+
+
+@trace.traced("command")
+def evaluate_gc(console, ast):
+    """Remove the workspaces of resolved stories whose PRs are all merged"""
+    dry_run = "--dry-run" in ast
+    plan = with_progress(gc_plan)()
+    table = Table(title="Workspaces")
+    table.add_column("Workspace")
+    table.add_column("Story")
+    table.add_column("PRs")
+    table.add_column("Action")
+    for workspace, issue, states, reason in plan:
+        table.add_row(
+            os.path.basename(workspace),
+            issue.status if issue else "[dim]unknown",
+            ", ".join(
+                f"{states.count(state)} {state.lower()}"
+                for state in sorted(set(states))
+            )
+            or "[dim]none",
+            f"[yellow]keep: {reason}" if reason else "[green]remove",
+        )
+    with trace.span("render", "gc table"):
+        console.print(table)
+
+    reclaimable = [workspace for workspace, _, _, reason in plan if not reason]
+    if dry_run:
+        console.print(f"{len(reclaimable)} workspace(s) would be removed")
+        return
+    for workspace in reclaimable:
+        trash(workspace)
+    empty_trash()
+    console.print(f"Removed {len(reclaimable)} workspace(s)")
@@ -1,9 +1,16 @@
 from collections import defaultdict
+from operator import attrgetter
+
 from rich.table import Table
 
+from robota.prefetch import describe_age, latest
 from robota.progress import with_progress
 
+from . import trace
+from .issue_index import find as find_issues
 from .jira import (
+    PAGE_SIZE,
+    get_active_sprint_issues,
     get_boards,
     get_my_issues,
     get_projects,
@@ -15,35 +22,52 @@ from .jira import (
 status_colors = {"To Do": "grey", "In Progress": "yellow", "In Review": "green"}
 
 
-def sprint_name(issue):
-    sprints = issue.fields.customfield_10020
-    if sprints and sprints[0].state == "active":
-        return sprints[0].name
-    return ""
+@trace.traced("render")
+def stories_table(title, stories, console, streaming=False):
+    """Render stories sorted by key, or in the order they arrive if `streaming`.
 
+    A streaming table is printed one chunk per fetched page while the stories
+    are still being fetched, so that large listings start showing up after the
+    first page. Only the first chunk has the title and the header.
+    """
+    if not streaming:
+        table = _stories_chunk(title)
+        for issue in sorted(stories, key=attrgetter("number"), reverse=True):
+            table.add_row(*story_row(issue))
+        console.print(table)
+        return
 
-def stories_table(title, stories, console):
-    table = Table(title=title)
+    table = _stories_chunk(title)
+    for issue in stories:
+        table.add_row(*story_row(issue))
+        if table.row_count == PAGE_SIZE:
+            console.print(table)
+            table = _stories_chunk(None, show_header=False)
+    if table.row_count or table.show_header:
+        console.print(table)
+
+
+def _stories_chunk(title, show_header=True):
+    table = Table(title=title, show_header=show_header)
     table.add_column("Key")
     table.add_column("Status")
     table.add_column("Summary")
-    for issue in sorted(stories, key=lambda i: int(i.key.split("-")[1]), reverse=True):
-        color = status_colors.get(issue.fields.status.name, "white")
-        estimate = (
-            int(issue.fields.customfield_10016)
-            if issue.fields.customfield_10016
-            else "[unestimated]"
-        )
-        table.add_row(
-            f"[{color}][link={issue.permalink()}]{issue.key}",
-            f"[{color}]{issue.fields.status.name} - {estimate}",
-            f"[{color}]{issue.fields.summary}",
-        )
-    console.print(table)
+    return table
 
 
-def sprint_table(stories, console):
-    table = Table(title="Current Sprint")
+def story_row(issue):
+    color = status_colors.get(issue.status, "white")
+    estimate = int(issue.estimate) if issue.estimate else "[unestimated]"
+    return (
+        f"[{color}][link={issue.url}]{issue.key}",
+        f"[{color}]{issue.status} - {estimate}",
+        f"[{color}]{issue.summary}",
+    )
+
+
+@trace.traced("render")
+def sprint_table(stories, console, title="Current Sprint"):
+    table = Table(title=title)
     table.add_column("Key")
     table.add_column("Status")
     table.add_column("Owner")
@@ -53,55 +77,56 @@ def sprint_table(stories, console):
     # Group stories by status
     status_groups = defaultdict(list)
     for issue in stories:
-        status_groups[issue.fields.status.name].append(issue)
+        status_groups[issue.status].append(issue)
 
     # Add rows to the table, ordered by status and key
     known_statuses = ["To Do", "In Progress", "In Review", "Done"]
     for status in known_statuses:
         if status in status_groups:
-            for issue in sorted(
-                status_groups[status], key=lambda i: int(i.key.split("-")[1])
-            ):
+            for issue in sorted(status_groups[status], key=attrgetter("number")):
                 color = status_colors.get(status, "white")
                 table.add_row(
-                    f"[{color}][link={issue.permalink()}]{issue.key}",
+                    f"[{color}][link={issue.url}]{issue.key}",
                     f"[{color}]{status}",
-                    f"[{color}]{issue.fields.assignee.displayName if issue.fields.assignee else 'Unassigned'}",
-                    f"[{color}]{issue.fields.summary}",
-                    f"[{color}]{issue.fields.project.key} / {sprint_name(issue)}",
+                    f"[{color}]{issue.assignee or 'Unassigned'}",
+                    f"[{color}]{issue.summary}",
+                    f"[{color}]{issue.project} / {issue.sprint}",
                 )
-    for issue in sorted(stories, key=lambda i: int(i.key.split("-")[1])):
-        if issue.fields.status.name in known_statuses:
+    for issue in sorted(stories, key=attrgetter("number")):
+        if issue.status in known_statuses:
             continue
-        status = issue.fields.status.name
         table.add_row(
-            f"[link={issue.permalink()}]{issue.key}",
-            f"{status}",
-            f"{issue.fields.assignee.displayName if issue.fields.assignee else 'Unassigned'}",
-            f"{issue.fields.summary}",
-            f"{issue.fields.project.key} / {sprint_name(issue)}",
+            f"[link={issue.url}]{issue.key}",
+            f"{issue.status}",
+            f"{issue.assignee or 'Unassigned'}",
+            f"{issue.summary}",
+            f"{issue.project} / {issue.sprint}",
         )
 
     console.print(table)
 
 
 @with_progress
+@trace.traced("command")
 def evaluate_list(console, ast):
-    """List my JIRA stories"""
-    my_issues = get_my_issues()
-    current_sprint = [i for i in my_issues if sprint_name(i)]
+    """List my JIRA stories (`l -f` to refresh now)"""
+    my_issues, age = latest("issues", get_my_issues, refresh="-f" in ast)
+    current_sprint = [i for i in my_issues if i.sprint]
 
     stories_table(
         "\[not in an active sprint]",
-        [i for i in my_issues if not sprint_name(i)],
+        [i for i in my_issues if not i.sprint],
         console,
     )
 
     if current_sprint:
-        stories_table(sprint_name(current_sprint[0]), current_sprint, console)
+        stories_table(current_sprint[0].sprint, current_sprint, console)
+    if age >= 1:
+        console.print(f"[dim]As of {describe_age(age)} ago")
 
 
 @with_progress
+@trace.traced("command")
 def evaluate_projects(console, ast):
     """List the projects from Jira"""
     projects = get_projects()
@@ -109,6 +134,7 @@ def evaluate_projects(console, ast):
 
 
 @with_progress
+@trace.traced("command")
 def evaluate_boards(console, ast):
     """List the boards from Jira"""
     boards = get_boards()
@@ -116,23 +142,53 @@ def evaluate_boards(console, ast):
 
 
 @with_progress
+@trace.traced("command")
 def evaluate_sprints(console, ast):
     """List the sprints for a board"""
     sprints = get_sprints(ast[0])
     console.print(sprints)
 
 
-@with_progress
+@trace.traced("command")
 def evaluate_sprint_issues(console, ast):
     """List the issues for a sprint"""
-    issues = get_sprint_issues(ast[0])
-    # print(issues[0].raw)
-    stories_table("Sprint", issues, console)
+    stories_table("Sprint", get_sprint_issues(ast[0]), console, streaming=True)
+
+
+@with_progress
+@trace.traced("command")
+def evaluate_sprint(console, ast):
+    """Show the active sprints of some boards (or of all Scrum boards) by status and owner"""
+    sprint_names, issues = get_active_sprint_issues(*ast[1:])
+    if not sprint_names:
+        console.print("No active sprints")
+        return
+    sprint_table(issues, console, title=", ".join(sprint_names))
+
+
+@trace.traced("command")
+def evaluate_find(console, ast):
+    """Search the issues seen so far, offline (`find m1 unit tests`)"""
+    text = " ".join(ast[1:])
+    issues = find_issues(text)
+    if not issues:
+        console.print(f"No issues found for {text!r}")
+        return
+    table = Table(title=f"Issues matching {text!r}")
+    table.add_column("Key")
+    table.add_column("Status")
+    table.add_column("Assignee")
+    table.add_column("Summary")
+    for issue in issues:
+        key, status, summary = story_row(issue)
+        table.add_row(key, status, issue.assignee or "Unassigned", summary)
+    console.print(table)
 
 
 @with_progress
+@trace.traced("command")
 def evaluate_unestimated(console, ast):
-    """List the unestimated issues for a board"""
-    unestimated = get_unestimated_issues_by_sprint(ast[0])
+    """List the unestimated issues for one or more boards"""
+    unestimated = get_unestimated_issues_by_sprint(*ast)
     for key, issues in unestimated.items():
         stories_table(key, issues, console)
@@ -0,0 +1,141 @@
+"""Git status of the repositories in the story workspaces under CHECKOUT_DIR.
+
+All repositories are inspected in parallel. Each result is cached in the store,
+keyed by the modification times of the repository's index, HEAD and branch
+refs, so that a repeated scan only runs git where something was committed,
+staged, fetched or pushed since. Edits to files that git has not seen yet don't
+touch any of those, so cached results also expire after STATUS_TTL seconds,
+and `done` never uses the cache.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from . import store
+from .checkout import run_git, workspace_repos
+from .env import CHECKOUT_DIR, STATUS_TTL
+from .gitmeta import git_dirs
+from .errors import RobotaError
+
+# Store namespace of the cached results, keyed by repository path
+REPO_STATUS = "repo-status"
+store.limit(REPO_STATUS, 2000)
+
+
+class RepoStatus(NamedTuple):
+    path: str
+    branch: str | None  # None if HEAD is detached
+    upstream: str | None
+    ahead: int  # commits not pushed to the upstream (or to any remote, without one)
+    behind: int
+    changed: int  # tracked files with staged or unstaged changes
+    untracked: int
+    error: str | None = None
+
+    @property
+    def clean(self):
+        return not (self.error or self.ahead or self.changed or self.untracked)
+
+
+def workspaces():
+    """Paths of all story workspaces."""
+    if not CHECKOUT_DIR or not os.path.isdir(CHECKOUT_DIR):
+        return []
+    return sorted(
+        entry.path
+        for entry in os.scandir(CHECKOUT_DIR)
+        if entry.is_dir() and not entry.name.startswith(".")
+    )
+
+
+def scan(workspace_paths=None, use_cache=True):
+    """{workspace path: [RepoStatus]} for the given (or all) workspaces."""
+    if workspace_paths is None:
+        workspace_paths = workspaces()
+    repos = {ws: workspace_repos(ws) for ws in workspace_paths}
+    with ThreadPoolExecutor() as pool:
+        statuses = pool.map(
+            lambda path: repo_status(path, use_cache),
+            [path for paths in repos.values() for path in paths],
+        )
+        return {ws: [next(statuses) for _ in paths] for ws, paths in repos.items()}
+
+
+def repo_status(path, use_cache=True):
+    if use_cache:
+        cached = store.get(REPO_STATUS, path)
+        stamp = _stamp(path)
+        if cached and stamp and cached["stamp"] == stamp:
+            return RepoStatus(*cached["status"])
+    try:
+        status = _git_status(path)
+    except (OSError, RobotaError) as err:
+        return RepoStatus(path, None, None, 0, 0, 0, 0, error=str(err))
+    # Stamped after git ran, as `git status` may refresh the index
+    store.set(
+        REPO_STATUS, path, {"stamp": _stamp(path), "status": status}, ttl=STATUS_TTL
+    )
+    return status
+
+
+def _git_status(path):
+    output = run_git(
+        ["-c", "core.untrackedCache=true", "status", "--porcelain=v2", "--branch"],
+        cwd=path,
+    )
+    status = _parse_status(path, output)
+    if status.upstream is None and status.branch is not None:
+        try:
+            ahead = int(
+                run_git(["rev-list", "--count", "HEAD", "--not", "--remotes"], cwd=path)
+            )
+        except RobotaError:  # no commits yet
+            ahead = 0
+        status = status._replace(ahead=ahead)
+    return status
+
+
+def _parse_status(path, output):
+    """RepoStatus from the output of `git status --porcelain=v2 --branch`."""
+    branch = upstream = None
+    ahead = behind = changed = untracked = 0
+    for line in output.splitlines():
+        if line.startswith("# branch.head "):
+            branch = line.split(" ", 2)[2]
+            if branch == "(detached)":
+                branch = None
+        elif line.startswith("# branch.upstream "):
+            upstream = line.split(" ", 2)[2]
+        elif line.startswith("# branch.ab "):
+            ahead, behind = (abs(int(n)) for n in line.split(" ")[2:4])
+        elif line[:2] in ("1 ", "2 ", "u "):
+            changed += 1
+        elif line.startswith("? "):
+            untracked += 1
+    return RepoStatus(path, branch, upstream, ahead, behind, changed, untracked)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _stamp(path):
+    """Modification times of the files that change with the repository's status."""
+    try:
+        git_dir, common_dir = git_dirs(path)
+        head_file = os.path.join(git_dir, "HEAD")
+        with open(head_file) as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+    # The work tree's own mtime changes when files are added to or removed from it
+    files = [path, os.path.join(git_dir, "index"), head_file]
+    files.append(os.path.join(common_dir, "packed-refs"))
+    if head.startswith("ref: refs/heads/"):
+        branch = head.removeprefix("ref: refs/heads/")
+        files.append(os.path.join(common_dir, "refs", "heads", branch))
+        files.append(os.path.join(common_dir, "refs", "remotes", "origin", branch))
+    return [head] + [_mtime(file) for file in files]
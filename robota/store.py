@@ -0,0 +1,147 @@
+"""A transactional key-value store shared by all robota processes.
+
+Values are JSON documents grouped into namespaces (the app state, the issue
+cache, ...) and may expire. The store is a SQLite database in WAL mode, so
+writes are atomic, and readers in one process never block on a writer in
+another. Each thread gets its own connection. Expired entries, and the oldest
+entries of namespaces with a `limit`, are deleted when a process first opens
+the store, and at most hourly after that in long-running ones like the daemon.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from .env import STORE_FILE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_by_age ON entries (namespace, updated_at);
+CREATE INDEX IF NOT EXISTS entries_by_expiry ON entries (expires_at);
+"""
+
+_local = threading.local()
+# Expired entries are deleted when a connection is opened, at most this often
+PURGE_INTERVAL = 3600
+_purged_at = None  # time.monotonic() of the last purge in this process
+_limits = {}  # namespace -> most entries that `purge` keeps, see `limit`
+
+
+def connection():
+    conn = getattr(_local, "connection", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(STORE_FILE), exist_ok=True)
+        # Autocommit mode: single statements are atomic on their own, and
+        # `transaction()` groups several of them.
+        conn = sqlite3.connect(STORE_FILE, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _local.connection = conn
+        _purge_now_and_then()
+    return conn
+
+
+@contextmanager
+def transaction():
+    """Apply all the writes made inside the block atomically, or none of them."""
+    conn = connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def get(namespace, key, default=None):
+    row = (
+        connection()
+        .execute(
+            "SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        )
+        .fetchone()
+    )
+    if row is None or (row[1] is not None and row[1] < time.time()):
+        return default
+    return json.loads(row[0])
+
+
+def set(namespace, key, value, ttl=None):
+    """Store a value, optionally expiring after `ttl` seconds."""
+    now = time.time()
+    connection().execute(
+        "INSERT INTO entries VALUES (?, ?, ?, ?, ?)"
+        " ON CONFLICT (namespace, key) DO UPDATE SET"
+        " value = excluded.value,"
+        " expires_at = excluded.expires_at,"
+        " updated_at = excluded.updated_at",
+        (namespace, key, json.dumps(value), ttl and now + ttl, now),
+    )
+
+
+def delete(namespace, key):
+    connection().execute(
+        "DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+    )
+
+
+def clear(namespace):
+    connection().execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+
+def items(namespace):
+    """All unexpired values in a namespace, as a dict."""
+    rows = connection().execute(
+        "SELECT key, value FROM entries WHERE namespace = ?"
+        " AND (expires_at IS NULL OR expires_at >= ?)",
+        (namespace, time.time()),
+    )
+    return {key: json.loads(value) for key, value in rows}
+
+
+def keys(namespace):
+    rows = connection().execute(
+        "SELECT key FROM entries WHERE namespace = ?"
+        " AND (expires_at IS NULL OR expires_at >= ?)",
+        (namespace, time.time()),
+    )
+    return [key for (key,) in rows]
+
+
+def _purge_now_and_then():
+    global _purged_at
+    now = time.monotonic()
+    if _purged_at is None or now - _purged_at > PURGE_INTERVAL:
+        _purged_at = now
+        purge()
+
+
+def limit(namespace, max_entries):
+    """Have `purge` keep only the `max_entries` most recently written entries."""
+    _limits[namespace] = max_entries
+
+
+def purge():
+    """Delete expired entries, and the oldest ones beyond each namespace's limit."""
+    with transaction():
+        conn = connection()
+        conn.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+        for namespace, max_entries in _limits.items():
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key NOT IN"
+                " (SELECT key FROM entries WHERE namespace = ?"
+                " ORDER BY updated_at DESC LIMIT ?)",
+                (namespace, namespace, max_entries),
+            )
@@ -0,0 +1,39 @@
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from . import trace
+
+
+class Stages:
+    """Wall-clock durations of the stages of a command, which may overlap.
+
+    Each stage is also a span when the command is traced.
+    """
+
+    def __init__(self):
+        self.durations = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            with trace.span("command", name):
+                yield
+        finally:
+            self.durations[name] = time.perf_counter() - start
+
+    def timed(self, name, fn):
+        """Wrap `fn` so that each call is recorded as stage `name`."""
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    def report(self):
+        print("Timings:")
+        for name, duration in self.durations.items():
+            print(f"  {name:<20} {duration:6.2f}s")
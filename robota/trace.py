@@ -0,0 +1,188 @@
+"""Span-based tracing behind `--profile` and `--trace-file`.
+
+Spans are grouped by category: startup (imports), auth (building API clients),
+jira and github (API calls), http (every request on the wire), git
+(subprocesses), render and command (the `evaluate_*` functions and pipeline
+stages). Nothing is recorded unless tracing was started, so instrumented code
+only pays for a flag check.
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+PROFILE_FLAG = "--profile"
+TRACE_FILE_FLAG = "--trace-file="
+
+_loaded_at = time.perf_counter()
+_startup = None
+_enabled = False
+_started_at = None
+_spans = []
+_lock = threading.Lock()
+_stacks = threading.local()
+
+
+class Span:
+    __slots__ = ("category", "name", "start", "duration", "thread", "parent", "attrs")
+
+    def __init__(self, category, name, start, duration, thread, parent, attrs):
+        self.category = category
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.thread = thread
+        self.parent = parent
+        self.attrs = attrs
+
+
+def imported():
+    """Mark the end of startup imports; called by `__main__` once they are done."""
+    global _startup
+    _startup = (_loaded_at, time.perf_counter())
+
+
+def forget_startup():
+    """Leave imports out of the next profile, as in a long-running daemon."""
+    global _startup
+    _startup = None
+
+
+def split_flags(args):
+    """Remove the tracing flags from command arguments.
+
+    Returns the remaining arguments, whether `--profile` was given and the
+    `--trace-file=` path, if any.
+    """
+    rest, profile, trace_file = [], False, None
+    for arg in args:
+        if arg == PROFILE_FLAG:
+            profile = True
+        elif arg.startswith(TRACE_FILE_FLAG):
+            trace_file = arg[len(TRACE_FILE_FLAG) :]
+        else:
+            rest.append(arg)
+    return rest, profile, trace_file
+
+
+def start():
+    global _enabled, _started_at, _startup
+    with _lock:
+        _spans.clear()
+        _started_at = time.perf_counter()
+        if _startup:
+            _started_at = _startup[0]
+            _record("startup", "import", _startup[0], _startup[1] - _startup[0])
+            _startup = None
+        _enabled = True
+
+
+def stop():
+    global _enabled
+    _enabled = False
+
+
+def enabled():
+    return _enabled
+
+
+def _record(category, name, start, duration, parent=None, attrs=None):
+    _spans.append(
+        Span(category, name, start, duration, threading.get_ident(), parent, attrs)
+    )
+
+
+@contextmanager
+def span(category, name, **attrs):
+    """Record the duration of the enclosed block."""
+    if not _enabled:
+        yield
+        return
+    if not hasattr(_stacks, "categories"):
+        _stacks.categories = []
+    stack = _stacks.categories
+    parent = stack[-1] if stack else None
+    stack.append(category)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        with _lock:
+            _record(category, name, start, duration, parent, attrs or None)
+
+
+def traced(category, name=None):
+    """Decorate a function so that each call is recorded as a span."""
+
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with span(category, span_name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def report():
+    """Print the time spent and the HTTP requests made in each category."""
+    with _lock:
+        spans = list(_spans)
+    wall = time.perf_counter() - _started_at
+    calls = defaultdict(int)
+    totals = defaultdict(float)
+    requests = defaultdict(int)
+    for s in spans:
+        calls[s.category] += 1
+        if s.parent != s.category:  # nested spans are already in their parent's
+            totals[s.category] += s.duration
+        if s.category == "http":
+            requests[s.parent or "other"] += 1
+    print("Profile:")
+    print(f"  {'stage':<10} {'calls':>6} {'total':>9}  requests")
+    for category in sorted(totals, key=totals.get, reverse=True):
+        count = requests.get(category)
+        print(
+            f"  {category:<10} {calls[category]:>6} {totals[category]:>8.3f}s"
+            + (f"  {count}" if count else "")
+        )
+    if requests.get("other"):
+        print(f"  {requests['other']} requests made outside of any stage")
+    print(f"  {'wall':<10} {'':>6} {wall:>8.3f}s")
+    slowest = sorted(spans, key=lambda s: s.duration, reverse=True)[:5]
+    if slowest:
+        print("Slowest spans:")
+        for s in slowest:
+            print(f"  {s.duration:8.3f}s  {s.category}: {s.name}")
+
+
+def write_chrome_trace(path):
+    """Dump the spans in the Chrome trace event format (chrome://tracing, Perfetto)."""
+    with _lock:
+        spans = list(_spans)
+    pid = os.getpid()
+    events = [
+        {
+            "name": s.name,
+            "cat": s.category,
+            "ph": "X",
+            "ts": round((s.start - _started_at) * 1e6),
+            "dur": round(s.duration * 1e6),
+            "pid": pid,
+            "tid": s.thread,
+            **({"args": s.attrs} if s.attrs else {}),
+        }
+        for s in spans
+    ]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,119 @@
+"""HTTP settings shared by the Jira and GitHub clients.
+
+Both clients keep pooled keep-alive connections sized for concurrent commands,
+use the same timeouts, and retry transient failures with jittered exponential
+backoff that honors Retry-After (and GitHub's rate limit headers).
+"""
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import trace
+from .env import HTTP_POOL_SIZE, HTTP_RETRIES, HTTP_TIMEOUT
+
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+BACKOFF_FACTOR = 0.5
+BACKOFF_JITTER = 1.0
+
+
+class JitteredRetry(Retry):
+    """Retry idempotent requests on 5xx, and any request that was rate limited.
+
+    A 429 response means the server did not process the request, so it is safe
+    to retry even a POST (like adding a Jira comment).
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429:
+            return bool(self.total)
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class TracingAdapter(HTTPAdapter):
+    """Record every request as a span; retries count toward its duration."""
+
+    def send(self, request, **kwargs):
+        if not trace.enabled():
+            return super().send(request, **kwargs)
+        path = urlsplit(request.url).path
+        with trace.span("http", f"{request.method} {path}"):
+            return super().send(request, **kwargs)
+
+
+def retry():
+    return JitteredRetry(
+        total=HTTP_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        backoff_factor=BACKOFF_FACTOR,
+        backoff_jitter=BACKOFF_JITTER,
+        # Let the client raise its own error for the last response
+        raise_on_status=False,
+    )
+
+
+def mount(session):
+    """Give a requests session our connection pool and retry policy."""
+    adapter = TracingAdapter(
+        pool_connections=HTTP_POOL_SIZE,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=retry(),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def github_options():
+    """Keyword arguments for `github.Github` with the same policy.
+
+    PyGithub builds its own sessions, so it gets its GithubRetry, which also
+    waits out GitHub's primary and secondary rate limits signalled with 403.
+    """
+    from github import GithubRetry
+
+    return {
+        "timeout": HTTP_TIMEOUT,
+        "pool_size": HTTP_POOL_SIZE,
+        "retry": GithubRetry(
+            total=HTTP_RETRIES,
+            status_forcelist=RETRY_STATUSES,
+            backoff_factor=BACKOFF_FACTOR,
+            backoff_jitter=BACKOFF_JITTER,
+            raise_on_status=False,
+        ),
+    }
+
+
+def github_connection_classes():
+    """PyGithub connection classes whose requests go through `TracingAdapter`."""
+    from github.Requester import (
+        HTTPRequestsConnectionClass,
+        HTTPSRequestsConnectionClass,
+    )
+
+    def traced(base):
+        class Connection(base):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.adapter = TracingAdapter(
+                    max_retries=self.retry,
+                    pool_connections=self.pool_size,
+                    pool_maxsize=self.pool_size,
+                )
+                self.session.mount(f"{self.protocol}://", self.adapter)
+
+        return Connection
+
+    return traced(HTTPRequestsConnectionClass), traced(HTTPSRequestsConnectionClass)
+
+
+def transient_error_message(err):
+    """Describe a network error that persisted through all retries, if it is one."""
+    if isinstance(err, (requests.ConnectionError, requests.Timeout)):
+        return f"Could not reach the server: {err}"
+    status = getattr(err, "status_code", None) or getattr(err, "status", None)
+    if status in RETRY_STATUSES:
+        return f"The server is unavailable (HTTP {status}), please try again later"
+    return None
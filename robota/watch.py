@@ -0,0 +1,174 @@
+"""Polling for changes to my Jira stories and GitHub PRs, for `robota watch`.
+
+Jira is asked only for the issues updated since the last poll, through the
+delta sync of `get_my_issues`. On GitHub, each open PR and the checks and
+statuses of its last commit are probed with conditional requests, and the PR
+list is fetched again only when a probe says something changed, or every
+WATCH_REFRESH seconds to pick up new PRs. Polls slow down while nothing
+changes, and after errors.
+"""
+import json
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rich.markup import escape
+
+from . import trace
+from .env import WATCH_INTERVAL, WATCH_MAX_INTERVAL, WATCH_REFRESH
+from .github import get_if_changed, get_my_prs, github_org
+from .jira import get_my_issues
+from .repl_github import check_labels, review_labels
+
+# How much longer to wait after each poll that found nothing
+BACKOFF = 1.5
+
+
+def diff_issues(old, new):
+    """Describe the changes between two {key: Issue} snapshots."""
+    for key in sorted(new.keys() - old.keys()):
+        issue = new[key]
+        yield f"[bold]{key}[/bold] is now yours ({issue.status}): {issue.summary}"
+    for key in sorted(old.keys() - new.keys()):
+        yield f"[bold]{key}[/bold] was resolved or reassigned: {old[key].summary}"
+    for key in sorted(old.keys() & new.keys()):
+        if old[key].status != new[key].status:
+            yield (
+                f"[bold]{key}[/bold] {old[key].status} → {new[key].status}:"
+                f" {new[key].summary}"
+            )
+
+
+def diff_prs(old, new):
+    """Describe the changes between two {(repository, number): PullRequest} snapshots."""
+    name = lambda pr: f"[bold]{pr.repository}#{pr.number}[/bold]"
+    for pr_id in sorted(new.keys() - old.keys()):
+        yield f"{name(new[pr_id])} opened: {new[pr_id].title}"
+    for pr_id in sorted(old.keys() - new.keys()):
+        yield f"{name(old[pr_id])} was merged or closed: {old[pr_id].title}"
+    for pr_id in sorted(old.keys() & new.keys()):
+        before, after = old[pr_id], new[pr_id]
+        if before.draft != after.draft:
+            yield f"{name(after)} is {'a draft' if after.draft else 'ready for review'}"
+        if before.review_decision != after.review_decision:
+            review = review_labels.get(after.review_decision, "no review decision")
+            yield f"{name(after)} review: {review}"
+        if before.checks != after.checks:
+            checks = check_labels.get(after.checks, after.checks or "none")
+            yield f"{name(after)} checks: {checks}"
+
+
+class Watcher:
+    """Keeps the last snapshots and ETags, and works out what changed since."""
+
+    def __init__(self):
+        self.issues = None
+        self.prs = None
+        self.prs_fetched_at = 0
+        self.etags = {}  # REST path -> ETag
+        self.min_interval = WATCH_INTERVAL
+        self.interval = WATCH_INTERVAL
+
+    def poll(self):
+        """Return descriptions of the changes since the last poll, and errors.
+
+        Jira and GitHub are polled independently, so that an error from one
+        doesn't lose the changes already found in the other.
+        """
+        changes, errors = [], []
+        for poll_source in (self._poll_issues, self._poll_prs):
+            try:
+                poll_source(changes)
+            except Exception as err:  # network trouble, API errors: try again later
+                errors.append(str(err))
+        if changes:
+            self.interval = self.min_interval
+        else:
+            self.back_off()
+        return changes, errors
+
+    def _poll_issues(self, changes):
+        issues = {issue.key: issue for issue in get_my_issues()}
+        if self.issues is not None:
+            changes.extend(diff_issues(self.issues, issues))
+        self.issues = issues
+
+    def _poll_prs(self, changes):
+        stale = time.monotonic() - self.prs_fetched_at > WATCH_REFRESH
+        if self.prs is None or stale or self._probe(list(self.etags)):
+            prs = {(pr.repository, pr.number): pr for pr in get_my_prs()}
+            self.prs_fetched_at = time.monotonic()
+            if self.prs is not None:
+                changes.extend(diff_prs(self.prs, prs))
+            self.prs = prs
+            paths = list(self._probe_paths())
+            self.etags = {
+                path: self.etags[path] for path in paths if path in self.etags
+            }
+            # Learn the ETags of new PRs and commits
+            self._probe([path for path in paths if path not in self.etags])
+
+    def back_off(self):
+        """Wait longer before the next poll, as after one that found nothing."""
+        self.interval = min(self.interval * BACKOFF, WATCH_MAX_INTERVAL)
+        self.interval = max(self.interval, self.min_interval)
+
+    def _probe_paths(self):
+        org = github_org()
+        for pr in self.prs.values():
+            yield f"/repos/{org}/{pr.repository}/pulls/{pr.number}"
+            if pr.head_sha:
+                # CI reports through check runs or through commit statuses
+                commit = f"/repos/{org}/{pr.repository}/commits/{pr.head_sha}"
+                yield f"{commit}/check-runs"
+                yield f"{commit}/status"
+
+    def _probe(self, paths):
+        """Whether any of the resources changed since their ETags were taken."""
+        with ThreadPoolExecutor() as pool:
+            results = list(
+                pool.map(lambda path: get_if_changed(path, self.etags.get(path)), paths)
+            )
+        changed = False
+        for path, (modified, etag, headers) in zip(paths, results):
+            # A resource whose ETag we didn't know yet hasn't changed since
+            changed = changed or (modified and path in self.etags)
+            self.etags[path] = etag
+            # GitHub may ask clients to poll less often
+            poll_interval = int(headers.get("x-poll-interval") or 0)
+            self.min_interval = max(self.min_interval, poll_interval)
+        return changed
+
+
+def notify(messages):
+    """Show a desktop notification, where a notifier is installed."""
+    from rich.text import Text
+
+    body = "\n".join(Text.from_markup(message).plain for message in messages)
+    if shutil.which("notify-send"):
+        subprocess.run(["notify-send", "robota", body], check=False)
+    elif shutil.which("osascript"):
+        script = f'display notification {json.dumps(body)} with title "robota"'
+        subprocess.run(["osascript", "-e", script], check=False)
+
+
+@trace.traced("command")
+def evaluate_watch(console, ast):
+    """Print changes to my stories and PRs as they happen (`watch --notify` for desktop notifications)"""
+    watcher = Watcher()
+    console.print("Watching my stories and PRs, Ctrl-C to stop")
+    try:
+        while True:
+            changes, errors = watcher.poll()
+            for error in errors:
+                console.print(
+                    f"[dim]{time.strftime('%H:%M')}[/dim] [red]{escape(error)}"
+                )
+            for change in changes:
+                console.print(f"[dim]{time.strftime('%H:%M')}[/dim] {change}")
+            if changes and "--notify" in ast:
+                notify(changes)
+            time.sleep(watcher.interval)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import tempfile
+
+import pytest
+
+# robota.env reads its settings at import time, and the store must not be the
+# user's own.
+os.environ.setdefault("GITHUB_REPOS", "")
+os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="robota-tests-")
+for name in ("STORE_FILE", "MIRROR_DIR", "DAEMON_SOCKET"):
+    os.environ.pop(name, None)
+
+
+@pytest.fixture
+def git():
+    """Run git with a fixed identity, returning its stripped output."""
+
+    def run(*args, cwd):
+        return subprocess.run(
+            ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com"]
+            + ["-c", "init.defaultBranch=main", *args],
+            cwd=cwd,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+
+    return run
@@ -0,0 +1,141 @@
+import os
+
+import pytest
+
+from robota import gitmeta
+from robota.errors import RobotaError
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "git@github.com:acme/widgets.git",
+        "git@github.com:acme/widgets",
+        "github.com:acme/widgets.git",
+        "ssh://git@github.com/acme/widgets.git",
+        "ssh://git@github.com:22/acme/widgets.git",
+        "https://github.com/acme/widgets",
+        "https://github.com/acme/widgets.git",
+        "https://token@github.example.com/acme/widgets.git/",
+    ],
+)
+def test_parse_remote_url(url):
+    assert gitmeta.parse_remote_url(url) == ("acme", "widgets")
+
+
+@pytest.mark.parametrize("url", ["https://github.com/acme", "git@github.com:widgets"])
+def test_parse_remote_url_without_owner(url):
+    with pytest.raises(RobotaError):
+        gitmeta.parse_remote_url(url)
+
+
+CONFIG = """\
+[core]
+	bare = false
+# url = not this one
+[remote "upstream"]
+	url = git@github.com:other/widgets.git
+[remote "origin"]
+	URL = git@github.com:acme/old.git
+	fetch = +refs/heads/*:refs/remotes/origin/*
+[Remote "origin"] url = git@github.com:acme/widgets.git ; moved
+"""
+
+
+def test_config_value():
+    lines = CONFIG.splitlines()
+    assert (
+        gitmeta._config_value(lines, "remote", "origin", "url")
+        == "git@github.com:acme/widgets.git"
+    )
+    assert (
+        gitmeta._config_value(lines, "remote", "upstream", "url")
+        == "git@github.com:other/widgets.git"
+    )
+    assert gitmeta._config_value(lines, "remote", "Origin", "url") is None
+    assert gitmeta._config_value(lines, "core", None, "bare") == "false"
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        '[include]\n\tpath = other.config\n[remote "origin"]\n\turl = x\n',
+        '[remote "origin"]\n\turl = "git@github.com:acme/widgets.git"\n',
+        '[remote "origin"]\n\turl = git@github.com:\\\n\tacme/widgets.git\n',
+    ],
+)
+def test_config_value_unsupported(config):
+    with pytest.raises(ValueError):
+        gitmeta._config_value(config.splitlines(), "remote", "origin", "url")
+
+
+def test_git_dirs_of_checkout_worktree_and_bare_repo(tmp_path, git):
+    main = tmp_path / "main"
+    git("init", str(main), cwd=tmp_path)
+    git("commit", "--allow-empty", "-m", "first", cwd=main)
+    git("worktree", "add", "-b", "story", str(tmp_path / "story"), cwd=main)
+    git("clone", "--bare", str(main), str(tmp_path / "bare.git"), cwd=tmp_path)
+
+    assert gitmeta.git_dirs(str(main)) == (str(main / ".git"),) * 2
+    git_dir, common_dir = gitmeta.git_dirs(str(tmp_path / "story"))
+    assert git_dir == str(main / ".git" / "worktrees" / "story")
+    assert common_dir == str(main / ".git")
+    assert (
+        gitmeta.git_dirs(str(tmp_path / "bare.git"))
+        == (str(tmp_path / "bare.git"),) * 2
+    )
+
+    assert gitmeta.current_branch(str(tmp_path / "story")) == "story"
+    (main / "sub" / "dir").mkdir(parents=True)
+    assert gitmeta.current_branch(str(main / "sub" / "dir")) == "main"
+
+
+def test_current_branch_detached(tmp_path, git):
+    git("init", cwd=tmp_path)
+    git("commit", "--allow-empty", "-m", "first", cwd=tmp_path)
+    git("checkout", "--detach", cwd=tmp_path)
+    assert gitmeta.current_branch(str(tmp_path)) == "HEAD"
+
+
+def test_ref_exists_loose_and_packed(tmp_path, git):
+    git("init", cwd=tmp_path)
+    git("commit", "--allow-empty", "-m", "first", cwd=tmp_path)
+    git("tag", "-a", "v1", "-m", "v1", cwd=tmp_path)
+    git("branch", "packed", cwd=tmp_path)
+    git("pack-refs", "--all", cwd=tmp_path)
+    git("branch", "loose", cwd=tmp_path)
+    git("worktree", "add", str(tmp_path / "wt"), "loose", cwd=tmp_path)
+
+    assert os.path.exists(tmp_path / ".git" / "refs" / "heads" / "loose")
+    assert not os.path.exists(tmp_path / ".git" / "refs" / "heads" / "packed")
+    for path in (tmp_path, tmp_path / "wt"):
+        assert gitmeta.ref_exists(str(path), "refs/heads/loose")
+        assert gitmeta.ref_exists(str(path), "refs/heads/packed")
+        assert gitmeta.ref_exists(str(path), "refs/tags/v1")
+        assert not gitmeta.ref_exists(str(path), "refs/heads/missing")
+        assert not gitmeta.ref_exists(str(path), "refs/remotes/origin/loose")
+
+
+def test_remote_url(tmp_path, git):
+    git("init", cwd=tmp_path)
+    git("remote", "add", "origin", "git@github.com:acme/widgets.git", cwd=tmp_path)
+    assert gitmeta.remote_url(str(tmp_path)) == "git@github.com:acme/widgets.git"
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        # the old section syntax, which this reader doesn't parse
+        "[remote.origin]\n\turl = git@github.com:acme/widgets.git\n",
+        # includes are resolved by git
+        "[include]\n\tpath = remotes.config\n",
+    ],
+)
+def test_remote_url_falls_back_to_git(tmp_path, git, config):
+    git("init", cwd=tmp_path)
+    (tmp_path / ".git" / "remotes.config").write_text(
+        '[remote "origin"]\n\turl = git@github.com:acme/widgets.git\n'
+    )
+    with open(tmp_path / ".git" / "config", "a") as f:
+        f.write(config)
+    assert gitmeta.remote_url(str(tmp_path)) == "git@github.com:acme/widgets.git"
@@ -0,0 +1,48 @@
+from robota import issue_index
+from robota.jira import Issue
+
+
+def issue(key, summary, status="To Do", assignee=None):
+    number = int(key.rsplit("-", 1)[1])
+    url = f"https://jira.example.com/browse/{key}"
+    return Issue(key, number, status, assignee, summary, None, "", (), "QX", url)
+
+
+def keys(text):
+    return [found.key for found in issue_index.find(text)]
+
+
+def test_find():
+    issue_index.update(
+        [
+            issue("QX-1", "Parser cleanup"),
+            issue("QX-12", "Fix the parser crash", assignee="Wilma Flint"),
+            issue("QX-2", "Document the parsers", status="In Progress"),
+        ]
+    )
+    assert keys("") == []
+    # An exact key comes first, then the other keys that it is a prefix of
+    assert keys("qx-1") == ["QX-1", "QX-12"]
+    # Whole words outrank prefixes
+    assert keys("parser")[-1] == "QX-2"
+    assert sorted(keys("pars")) == ["QX-1", "QX-12", "QX-2"]
+    # Every word has to match, in any of the indexed fields
+    assert keys("parser crash") == ["QX-12"]
+    assert keys("wil pars") == ["QX-12"]
+    assert keys("progress doc") == ["QX-2"]
+    assert keys("parser nothing") == []
+
+
+def test_update_refreshes_changed_issues():
+    issue_index.update([issue("QY-1", "Old title")])
+    issue_index.update([issue("QY-1", "New title", status="Done")])
+    assert keys("qy old") == []
+    [found] = issue_index.find("qy new")
+    assert (found.summary, found.status) == ("New title", "Done")
+
+
+def test_find_without_full_text_search(monkeypatch):
+    issue_index.update([issue("QZ-1", "Retry uploads"), issue("QZ-2", "Upload page")])
+    monkeypatch.setattr(issue_index, "_has_fts", lambda: False)
+    assert sorted(keys("qz upload")) == ["QZ-1", "QZ-2"]
+    assert keys("qz retry") == ["QZ-1"]
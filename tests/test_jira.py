@@ -0,0 +1,150 @@
+import time
+
+import pytest
+
+from robota import jira, store
+from robota.errors import RobotaError
+
+ME = {"accountId": "5b10ac8d82e05b22cc7d4ef5", "name": "wilma"}
+
+
+@pytest.fixture
+def fields(monkeypatch):
+    """Build `Issue` records from raw JSON without asking Jira for its fields."""
+    monkeypatch.setattr(jira, "JIRA_HOST", "https://jira.example.com")
+    monkeypatch.setattr(jira, "custom_fields", lambda: ("points", "sprints"))
+
+
+def raw_issue(key, assignee=ME, resolution=None):
+    return {
+        "key": key,
+        "fields": {
+            "summary": f"Story {key}",
+            "status": {"name": "Done" if resolution else "In Progress"},
+            "assignee": assignee and {"displayName": "Someone", **assignee},
+            "project": {"key": key.split("-")[0]},
+            "resolution": resolution and {"name": resolution},
+            "issuetype": {"name": "Story"},
+        },
+    }
+
+
+@pytest.mark.parametrize(
+    "assignee, resolution, mine",
+    [
+        (ME, None, True),
+        ({"accountId": ME["accountId"]}, None, True),
+        ({"name": "wilma"}, None, True),  # Jira Server has no account IDs
+        (ME, "Done", False),
+        (None, None, False),
+        ({"accountId": "557058:f58131cb"}, None, False),
+        ({"key": "JIRAUSER10100"}, None, False),  # neither side has a key
+    ],
+)
+def test_is_mine(assignee, resolution, mine):
+    assert jira._is_mine(raw_issue("SD-1", assignee, resolution), ME) is mine
+
+
+def test_delta_sync(monkeypatch, fields):
+    store.clear(jira.MY_ISSUES)
+    for key in ("SD-1", "SD-2", "SD-3"):
+        store.set(jira.MY_ISSUES, key, jira.Issue.from_raw(raw_issue(key)))
+    synced_at = time.time() - 90
+    queries = []
+
+    def search(jql):
+        queries.append(jql)
+        return [
+            raw_issue("SD-1", resolution="Done"),
+            raw_issue("SD-2", assignee={"accountId": "557058:f58131cb"}),
+            raw_issue("SD-4"),
+        ]
+
+    monkeypatch.setattr(jira, "search", search)
+    jira._delta_sync({"synced_at": synced_at, "me": ME})
+
+    # Cached issues are queried by key, since they may no longer match the JQL
+    assert queries == [
+        f"({jira.MY_ISSUES_JQL} OR key in (SD-1, SD-2, SD-3))" ' AND updated >= "-3m"'
+    ]
+    # Resolved and reassigned issues are dropped, unchanged ones kept
+    assert sorted(store.keys(jira.MY_ISSUES)) == ["SD-3", "SD-4"]
+    sync = store.get(jira.SYNC, jira.MY_ISSUES)
+    assert sync["me"] == ME and sync["synced_at"] > synced_at
+
+
+WORKFLOW = [
+    {"id": "11", "name": "Start", "to": {"name": "In Progress"}},
+    {"id": "21", "name": "Done", "to": {"name": "In Review"}},
+    {"id": "31", "name": "Close", "to": {"name": "Done"}},
+]
+
+
+def test_find_transition():
+    transitions = [
+        {"id": t["id"], "name": t["name"], "to": t["to"]["name"]} for t in WORKFLOW
+    ]
+    # The target status wins over a transition of the same name
+    assert jira._find_transition(transitions, "done")["id"] == "31"
+    assert jira._find_transition(transitions, "Start")["id"] == "11"
+    assert jira._find_transition(transitions, "in review")["id"] == "21"
+    assert jira._find_transition([], "Done") is None
+    assert jira._find_transition([{"id": "1", "name": "Go", "to": None}], "x") is None
+
+
+class Rejected(Exception):
+    status_code = 400
+
+
+class FakeClient:
+    """Answers with the transitions available from the issue's current status."""
+
+    def __init__(self, available):
+        self.available = available
+        self.transitions_calls = 0
+        self.sent = []
+
+    def transitions(self, key):
+        self.transitions_calls += 1
+        return self.available
+
+    def transition_issue(self, key, transition_id):
+        if transition_id not in {t["id"] for t in self.available}:
+            raise Rejected
+        self.sent.append((key, transition_id))
+
+
+def story(key):
+    return jira.Issue(key, 1, "To Do", None, "", None, "", (), "TR", "", None, "Story")
+
+
+def test_set_issue_status_caches_transitions_per_workflow(monkeypatch):
+    cache_key = "transitions:TR:Story"
+    store.delete(jira.METADATA, cache_key)
+    fake = FakeClient(WORKFLOW[:1])
+    monkeypatch.setattr(jira, "client", lambda: fake)
+
+    jira.set_issue_status(story("TR-1"), "In Progress")
+    assert fake.transitions_calls == 1
+    # Another issue of the same project and type reuses the cached transition
+    jira.set_issue_status(story("TR-2"), "in progress")
+    assert fake.transitions_calls == 1
+    assert fake.sent == [("TR-1", "11"), ("TR-2", "11")]
+
+    # From another status, the cached transitions don't apply; the fresh ones
+    # are merged with those that lead out of other statuses
+    fake.available = WORKFLOW[1:]
+    jira.set_issue_status(story("TR-1"), "In Review")
+    assert fake.transitions_calls == 2
+    assert fake.sent[-1] == ("TR-1", "21")
+    assert [t["id"] for t in store.get(jira.METADATA, cache_key)] == ["11", "21", "31"]
+
+    # A cached transition that Jira rejects is dropped and replaced
+    fake.available = [{"id": "41", "name": "Start", "to": {"name": "In Progress"}}]
+    jira.set_issue_status(story("TR-3"), "In Progress")
+    assert fake.sent[-1] == ("TR-3", "41")
+    cached = store.get(jira.METADATA, cache_key)
+    assert [t["id"] for t in cached] == ["21", "31", "41"]
+
+    with pytest.raises(RobotaError):
+        jira.set_issue_status(story("TR-3"), "Done")
@@ -0,0 +1,62 @@
+from robota import status
+from robota.status import RepoStatus
+
+PORCELAIN = """\
+# branch.oid 4b825dc642cb6eb9a060e54bf8d69288fbee4904
+# branch.head vlad-ST-12-fix-it
+# branch.upstream origin/vlad-ST-12-fix-it
+# branch.ab +2 -3
+1 .M N... 100644 100644 100644 3b18e5 3b18e5 README.md
+1 A. N... 000000 100644 100644 000000 e69de2 new file.py
+2 R. N... 100644 100644 100644 e69de2 e69de2 R100 renamed.py\told.py
+u UU N... 100644 100644 100644 100644 e69de2 e69de2 e69de2 conflict.py
+? notes.txt
+? build/
+! ignored.log
+"""
+
+
+def test_parse_status():
+    assert status._parse_status("/w/repo", PORCELAIN) == RepoStatus(
+        "/w/repo", "vlad-ST-12-fix-it", "origin/vlad-ST-12-fix-it", 2, 3, 4, 2
+    )
+
+
+def test_parse_status_clean_detached_without_upstream():
+    output = "# branch.oid 4b825dc642cb6eb9a060e54bf8d69288fbee4904\n# branch.head (detached)\n"
+    parsed = status._parse_status("/w/repo", output)
+    assert parsed == RepoStatus("/w/repo", None, None, 0, 0, 0, 0)
+    assert parsed.clean
+
+
+def test_parse_status_gone_upstream():
+    # After the remote branch is deleted, git prints no ahead/behind counts
+    output = "# branch.head story\n# branch.upstream origin/story\n"
+    assert status._parse_status("/w/repo", output) == RepoStatus(
+        "/w/repo", "story", "origin/story", 0, 0, 0, 0
+    )
+
+
+def test_git_status(tmp_path, git):
+    remote, work = tmp_path / "remote.git", tmp_path / "work"
+    git("init", "--bare", str(remote), cwd=tmp_path)
+    git("clone", str(remote), str(work), cwd=tmp_path)
+    git("commit", "--allow-empty", "-m", "first", cwd=work)
+    git("push", "-u", "origin", "main", cwd=work)
+    git("checkout", "-b", "story", cwd=work)
+    (work / "a.txt").write_text("a")
+    git("add", "a.txt", cwd=work)
+    git("commit", "-m", "second", cwd=work)
+
+    # Without an upstream, commits that no remote has count as ahead
+    assert status._git_status(str(work)) == RepoStatus(
+        str(work), "story", None, 1, 0, 0, 0
+    )
+
+    git("push", "-u", "origin", "story", cwd=work)
+    git("commit", "--allow-empty", "-m", "third", cwd=work)
+    (work / "a.txt").write_text("changed")
+    (work / "b.txt").write_text("b")
+    result = status._git_status(str(work))
+    assert result == RepoStatus(str(work), "story", "origin/story", 1, 0, 1, 1)
+    assert not result.clean
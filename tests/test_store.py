@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+from robota import store
+
+
+def test_expired_entries_are_hidden_and_purged(monkeypatch):
+    store.set("test-ttl", "short", 1, ttl=10)
+    store.set("test-ttl", "long", 2, ttl=100)
+    store.set("test-ttl", "forever", 3)
+    assert store.items("test-ttl") == {"short": 1, "long": 2, "forever": 3}
+
+    later = time.time() + 50
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert store.get("test-ttl", "short", "gone") == "gone"
+    assert store.items("test-ttl") == {"long": 2, "forever": 3}
+    assert sorted(store.keys("test-ttl")) == ["forever", "long"]
+
+    store.purge()
+    rows = store.connection().execute(
+        "SELECT key FROM entries WHERE namespace = 'test-ttl' ORDER BY key"
+    )
+    assert [key for (key,) in rows] == ["forever", "long"]
+
+
+def test_purge_keeps_the_newest_entries_of_limited_namespaces(monkeypatch):
+    now = time.time()
+    for i in range(5):
+        monkeypatch.setattr(time, "time", lambda: now + i)
+        store.set("test-limited", f"key{i}", i)
+        store.set("test-unlimited", f"key{i}", i)
+    store.set("test-limited", "key0", "rewritten")
+    monkeypatch.setitem(store._limits, "test-limited", 3)
+
+    store.purge()
+    assert store.items("test-limited") == {"key0": "rewritten", "key3": 3, "key4": 4}
+    assert len(store.items("test-unlimited")) == 5
+
+
+def test_transaction_rolls_back_on_error():
+    store.set("test-transaction", "kept", 1)
+    with pytest.raises(RuntimeError), store.transaction():
+        store.set("test-transaction", "kept", 2)
+        store.set("test-transaction", "new", 3)
+        raise RuntimeError
+    assert store.items("test-transaction") == {"kept": 1}
@@ -0,0 +1,50 @@
+from robota.github import PullRequest
+from robota.jira import Issue
+from robota.watch import diff_issues, diff_prs
+
+
+def issue(key, status, summary="Fix it"):
+    return Issue(
+        key, int(key.split("-")[1]), status, None, summary, None, "", (), "WA", ""
+    )
+
+
+def pr(number, draft=False, review=None, checks=None, title="Fix it"):
+    return PullRequest("widgets", number, title, "", draft, review, checks)
+
+
+def test_diff_issues():
+    old = {"WA-1": issue("WA-1", "To Do"), "WA-2": issue("WA-2", "In Progress")}
+    new = {
+        "WA-1": issue("WA-1", "In Progress", "Fix it properly"),
+        "WA-3": issue("WA-3", "To Do", "New story"),
+    }
+    assert list(diff_issues(old, new)) == [
+        "[bold]WA-3[/bold] is now yours (To Do): New story",
+        "[bold]WA-2[/bold] was resolved or reassigned: Fix it",
+        "[bold]WA-1[/bold] To Do → In Progress: Fix it properly",
+    ]
+    assert list(diff_issues(new, new)) == []
+
+
+def test_diff_prs():
+    old = {
+        ("widgets", 1): pr(1, draft=True, checks="PENDING"),
+        ("widgets", 2): pr(2, review="REVIEW_REQUIRED", checks="SUCCESS"),
+        ("widgets", 3): pr(3, title="Old"),
+    }
+    new = {
+        ("widgets", 1): pr(1, review="APPROVED", checks="FAILURE"),
+        ("widgets", 2): pr(2, checks=None),
+        ("widgets", 4): pr(4, title="New"),
+    }
+    assert list(diff_prs(old, new)) == [
+        "[bold]widgets#4[/bold] opened: New",
+        "[bold]widgets#3[/bold] was merged or closed: Old",
+        "[bold]widgets#1[/bold] is ready for review",
+        "[bold]widgets#1[/bold] review: [green]approved",
+        "[bold]widgets#1[/bold] checks: [red]failing",
+        "[bold]widgets#2[/bold] review: no review decision",
+        "[bold]widgets#2[/bold] checks: none",
+    ]
+    assert list(diff_prs(new, new)) == []